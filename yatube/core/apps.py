@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .memory import install_signal_handler
+        from .tracing import install_template_spans
+        install_template_spans()
+        install_signal_handler()
@@ -0,0 +1,65 @@
+import json
+import statistics
+import time
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+
+class Budget:
+    """Предельные затраты на одну страницу: число SQL-запросов, время
+    ответа в миллисекундах и размер ответа в байтах."""
+
+    def __init__(self, queries, time_ms, size):
+        self.queries = queries
+        self.time_ms = time_ms
+        self.size = size
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'time_ms': self.time_ms,
+            'size': self.size,
+        }
+
+
+def measure(request, repeat=3):
+    """Прогревает страницу и замеряет её repeat раз без кэша фрагментов.
+    Возвращает число запросов, медиану времени и размер ответа."""
+    request()
+    timings = []
+    for _ in range(repeat):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = request()
+            timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'status': response.status_code,
+        'queries': len(queries),
+        'time_ms': round(statistics.median(timings), 2),
+        'size': len(response.content),
+    }
+
+
+def violations(budget, measurement, limits=None):
+    """Превышения бюджета; limits — какие пределы проверять (по умолчанию
+    все)."""
+    return [
+        f'{name}: {measurement[name]} > {limit}'
+        for name, limit in budget.as_dict().items()
+        if (limits is None or name in limits) and measurement[name] > limit
+    ]
+
+
+def write_report(path, dataset, results):
+    report = {
+        'generated': timezone.now().isoformat(),
+        'dataset': dataset,
+        'pages': results,
+    }
+    with open(path, 'w', encoding='utf-8') as report_file:
+        json.dump(report, report_file, ensure_ascii=False, indent=2)
+        report_file.write('\n')
@@ -0,0 +1,383 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE TABLE IF NOT EXISTS invalidations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    origin TEXT NOT NULL,
+    created REAL NOT NULL
+);
+"""
+
+# Ключ в журнале инвалидаций, означающий очистку всего кэша
+CLEAR_ALL = '*'
+
+# Первый байт потока zlib; pickle протокола 2+ начинается с 0x80,
+# так что сжатые и несжатые значения различаются без отдельного флага
+ZLIB_HEADER = b'x'
+
+
+class TieredCache(BaseCache):
+    """Двухуровневый кэш: L1 — LRU в памяти процесса, L2 — общий для
+    всех воркеров файл SQLite (LOCATION).
+
+    Каждая запись в L2 добавляет строку в журнал инвалидаций; перед
+    чтением из L1 процесс дочитывает журнал и выбрасывает из L1 ключи,
+    изменённые другими процессами, так что устаревшие значения
+    не отдаются. Оба уровня ограничены по размеру: L1 по числу записей
+    и байтам, L2 по байтам с вытеснением давно не читанных записей.
+
+    OPTIONS: L1_MAX_ENTRIES, L1_MAX_BYTES, L2_MAX_BYTES, POLL_INTERVAL
+    (секунды между чтениями журнала, по умолчанию 1: столько L1 может
+    отдавать значение, уже изменённое другим процессом; 0 — читать журнал
+    перед каждым чтением L1, что почти сводит L1 на нет),
+    CULL_EVERY (через сколько записей проверять размер L2), LOG_TTL,
+    COMPRESS_MIN_BYTES (значения от этого размера сжимаются zlib в обоих
+    уровнях, 0 — не сжимать) и COMPRESS_LEVEL.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.l1_max_entries = options.get('L1_MAX_ENTRIES', 1000)
+        self.l1_max_bytes = options.get('L1_MAX_BYTES', 32 * 1024 * 1024)
+        self.l2_max_bytes = options.get('L2_MAX_BYTES', 256 * 1024 * 1024)
+        self.poll_interval = options.get('POLL_INTERVAL', 1)
+        self.cull_every = options.get('CULL_EVERY', 50)
+        self.log_ttl = options.get('LOG_TTL', 60 * 60)
+        self.compress_min_bytes = options.get('COMPRESS_MIN_BYTES', 0)
+        self.compress_level = options.get('COMPRESS_LEVEL', 6)
+        self.compression = {
+            'values': 0,
+            'raw_bytes': 0,
+            'stored_bytes': 0,
+            'compress_seconds': 0.0,
+            'decompress_seconds': 0.0,
+        }
+        self.origin = uuid.uuid4().hex
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._l1 = OrderedDict()
+        self._l1_bytes = 0
+        self._last_seen = None
+        self.origin_pid = None
+        self._last_poll = 0
+        self._writes = 0
+
+    def _db(self):
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            # После fork соединение родителя использовать нельзя
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.executescript(SCHEMA)
+            self._local.db = db
+            self._local.pid = pid
+            if self._last_seen is None or self.origin_pid != pid:
+                self._reset_log_position(db)
+        return self._local.db
+
+    def _reset_log_position(self, db):
+        with self._lock:
+            self.origin_pid = os.getpid()
+            self.origin = uuid.uuid4().hex
+            self._last_seen = db.execute(
+                'SELECT COALESCE(MAX(id), 0) FROM invalidations'
+            ).fetchone()[0]
+            self._l1_clear()
+
+    # Сжатие
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self.compression[name] += amount
+
+    def _encode(self, value):
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if (not self.compress_min_bytes
+                or len(pickled) < self.compress_min_bytes):
+            return pickled
+        start = time.perf_counter()
+        packed = zlib.compress(pickled, self.compress_level)
+        elapsed = time.perf_counter() - start
+        metrics.cache_compression_seconds.inc('compress', amount=elapsed)
+        if len(packed) >= len(pickled):
+            return pickled
+        metrics.cache_compression_bytes.inc('raw', amount=len(pickled))
+        metrics.cache_compression_bytes.inc('stored', amount=len(packed))
+        self._count(
+            values=1, raw_bytes=len(pickled), stored_bytes=len(packed),
+            compress_seconds=elapsed,
+        )
+        return packed
+
+    def _decode(self, stored):
+        if stored[:1] != ZLIB_HEADER:
+            return pickle.loads(stored)
+        start = time.perf_counter()
+        pickled = zlib.decompress(stored)
+        elapsed = time.perf_counter() - start
+        metrics.cache_compression_seconds.inc('decompress', amount=elapsed)
+        self._count(decompress_seconds=elapsed)
+        return pickle.loads(pickled)
+
+    def compression_stats(self):
+        """Сжатие в этом процессе: сколько значений сжато, байты до и
+        после, их отношение и время на сжатие и распаковку."""
+        with self._lock:
+            stats = dict(self.compression)
+        stats['ratio'] = (
+            round(stats['raw_bytes'] / stats['stored_bytes'], 2)
+            if stats['stored_bytes'] else None
+        )
+        return stats
+
+    # L1
+
+    def _l1_clear(self):
+        self._l1.clear()
+        self._l1_bytes = 0
+
+    def _l1_pop(self, key):
+        entry = self._l1.pop(key, None)
+        if entry is not None:
+            self._l1_bytes -= len(entry[1])
+
+    def _l1_set(self, key, expires, pickled):
+        with self._lock:
+            self._l1_pop(key)
+            self._l1[key] = (expires, pickled)
+            self._l1_bytes += len(pickled)
+            while self._l1 and (
+                len(self._l1) > self.l1_max_entries
+                or self._l1_bytes > self.l1_max_bytes
+            ):
+                oldest, (_, value) = self._l1.popitem(last=False)
+                self._l1_bytes -= len(value)
+
+    def _l1_get(self, key, now):
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] <= now:
+                self._l1_pop(key)
+                return None
+            self._l1.move_to_end(key)
+            return entry[1]
+
+    # Журнал инвалидаций
+
+    def _poll(self, db):
+        now = time.monotonic()
+        if self.poll_interval and now - self._last_poll < self.poll_interval:
+            return
+        self._last_poll = now
+        rows = db.execute(
+            'SELECT id, key, origin FROM invalidations WHERE id > ? '
+            'ORDER BY id', (self._last_seen,)
+        ).fetchall()
+        if not rows:
+            return
+        with self._lock:
+            if rows[0][0] != self._last_seen + 1:
+                # Часть журнала уже удалена: не знаем, что менялось
+                self._l1_clear()
+            for row_id, key, origin in rows:
+                if origin == self.origin:
+                    continue
+                if key == CLEAR_ALL:
+                    self._l1_clear()
+                else:
+                    self._l1_pop(key)
+            self._last_seen = max(self._last_seen, rows[-1][0])
+
+    def _log(self, db, key):
+        db.execute(
+            'INSERT INTO invalidations (key, origin, created) '
+            'VALUES (?, ?, ?)', (key, self.origin, time.time())
+        )
+
+    # L2
+
+    def _cull(self, db):
+        self._writes += 1
+        if self._writes % self.cull_every:
+            return
+        now = time.time()
+        db.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        db.execute(
+            'DELETE FROM invalidations WHERE created < ?',
+            (now - self.log_ttl,)
+        )
+        total = db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM cache'
+        ).fetchone()[0]
+        if total <= self.l2_max_bytes:
+            return
+        excess = total - self.l2_max_bytes * 0.9
+        victims = []
+        for key, size in db.execute(
+            'SELECT key, size FROM cache ORDER BY accessed'
+        ):
+            victims.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        db.executemany('DELETE FROM cache WHERE key = ?', victims)
+
+    def _store(self, key, value, timeout, only_if_missing=False):
+        pickled = self._encode(value)
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        db = self._db()
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            sql = (
+                'INSERT INTO cache (key, value, expires, size, accessed) '
+                'VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+                'value = excluded.value, expires = excluded.expires, '
+                'size = excluded.size, accessed = excluded.accessed'
+            )
+            params = [key, pickled, expires, len(pickled), now]
+            if only_if_missing:
+                sql += (
+                    ' WHERE cache.expires IS NOT NULL'
+                    ' AND cache.expires <= ?'
+                )
+                params.append(now)
+            stored = db.execute(sql, params).rowcount > 0
+            if stored:
+                self._log(db, key)
+                self._cull(db)
+        if stored:
+            self._l1_set(key, expires, pickled)
+        return stored
+
+    # API кэша Django
+
+    def get(self, key, default=None, version=None):
+        fragment = metrics.fragment_name(key)
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        db = self._db()
+        self._poll(db)
+        now = time.time()
+        pickled = self._l1_get(key, now)
+        if pickled is not None:
+            metrics.cache_tiers.inc('l1', 'hit')
+            metrics.cache_requests.inc(fragment, 'hit')
+            return self._decode(pickled)
+        row = db.execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            metrics.cache_tiers.inc('l2', 'miss')
+            metrics.cache_requests.inc(fragment, 'miss')
+            return default
+        pickled, expires, accessed = row
+        if now - accessed > 60:
+            db.execute(
+                'UPDATE cache SET accessed = ? WHERE key = ?', (now, key)
+            )
+        metrics.cache_tiers.inc('l2', 'hit')
+        metrics.cache_requests.inc(fragment, 'hit')
+        self._l1_set(key, expires, pickled)
+        return self._decode(pickled)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._store(key, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._store(key, value, timeout, only_if_missing=True)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        db = self._db()
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            touched = db.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time())
+            ).rowcount > 0
+            if touched:
+                self._log(db, key)
+        with self._lock:
+            self._l1_pop(key)
+        return touched
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._db().execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)', (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        db = self._db()
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            deleted = db.execute(
+                'DELETE FROM cache WHERE key = ?', (key,)
+            ).rowcount > 0
+            self._log(db, key)
+        with self._lock:
+            self._l1_pop(key)
+        return deleted
+
+    def clear(self):
+        db = self._db()
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            db.execute('DELETE FROM cache')
+            self._log(db, CLEAR_ALL)
+        with self._lock:
+            self._l1_clear()
+
+    def sizes(self):
+        """[(уровень, записей, байт)] для диагностики памяти."""
+        with self._lock:
+            l1 = ('l1', len(self._l1), self._l1_bytes)
+        entries, size = self._db().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache'
+        ).fetchone()
+        return [l1, ('l2', entries, size)]
+
+    def close(self, **kwargs):
+        # Соединения с файлом L2 живут между запросами
+        pass
@@ -0,0 +1,46 @@
+import hashlib
+import time
+
+from django.core.cache import cache as default_cache
+
+TAG_PREFIX = 'tag.'
+
+
+def tag_key(tag):
+    return f'{TAG_PREFIX}{tag}'
+
+
+def versions(tags, cache=None):
+    """Текущие версии тегов; отсутствующим назначается новая версия.
+
+    Версия — время создания в наносекундах, поэтому вытесненный из кэша
+    тег не вернётся к прежнему значению и не оживит старые записи."""
+    cache = cache or default_cache
+    keys = [tag_key(tag) for tag in tags]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            version = time.time_ns()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            found[key] = version
+    return [found[key] for key in keys]
+
+
+def signature(tags, cache=None):
+    """Подпись текущих версий тегов: после invalidate() любого из них
+    она меняется. Без тегов — пустая строка."""
+    tags = sorted(set(tags))
+    if not tags:
+        return ''
+    pairs = zip(tags, versions(tags, cache))
+    return hashlib.md5(
+        ';'.join(f'{tag}={version}' for tag, version in pairs).encode()
+    ).hexdigest()
+
+
+def invalidate(*tags, cache=None):
+    """Делает устаревшими все записи с любым из тегов."""
+    cache = cache or default_cache
+    version = time.time_ns()
+    cache.set_many({tag_key(tag): version for tag in tags}, None)
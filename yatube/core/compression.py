@@ -0,0 +1,144 @@
+import re
+import time
+import zlib
+from itertools import chain
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from . import metrics
+
+ACCEPTS_GZIP_RE = re.compile(r'\bgzip\b')
+
+# Заголовок gzip без имени файла и с нулевым mtime: одинаковые ответы
+# сжимаются в одинаковые байты
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def compressor(level):
+    return zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+
+
+def compress(data, level):
+    """Сжимает байты в формат gzip."""
+    packer = compressor(level)
+    return packer.compress(data) + packer.flush()
+
+
+def compress_stream(chunks, level):
+    """Сжимает поток кусков. Каждый кусок дожимается Z_SYNC_FLUSH и сразу
+    уходит клиенту: браузер начинает разбирать шапку страницы, не дожидаясь
+    карточек, ценой нескольких байт на кусок."""
+    packer = compressor(level)
+    raw = sent = 0
+    elapsed = 0.0
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            start = time.perf_counter()
+            packed = packer.compress(chunk) + packer.flush(zlib.Z_SYNC_FLUSH)
+            elapsed += time.perf_counter() - start
+            raw += len(chunk)
+            sent += len(packed)
+            yield packed
+        tail = packer.flush()
+        sent += len(tail)
+        yield tail
+    finally:
+        record(raw, sent, elapsed)
+
+
+def record(raw, sent, elapsed):
+    metrics.response_compression_bytes.inc('raw', amount=raw)
+    metrics.response_compression_bytes.inc('sent', amount=sent)
+    metrics.response_compression_seconds.inc(amount=elapsed)
+
+
+def peek(chunks, limit):
+    """Читает куски потока, пока их не наберётся limit байт. Возвращает
+    прочитанное, его размер и ещё не прочитанный остаток."""
+    chunks = iter(chunks)
+    head = []
+    size = 0
+    for chunk in chunks:
+        head.append(chunk)
+        size += len(chunk)
+        if size >= limit:
+            break
+    return head, size, chunks
+
+
+def compressible(response):
+    content_type = response.get('Content-Type', '').split(';')[0].strip()
+    return (
+        content_type.lower() in settings.GZIP_CONTENT_TYPES
+        and not response.has_header('Content-Encoding')
+    )
+
+
+class GZipMiddleware:
+    """Сжимает gzip текстовые ответы типов GZIP_CONTENT_TYPES от
+    GZIP_MIN_BYTES байт уровнем GZIP_LEVEL. В отличие от
+    django.middleware.gzip уровень настраивается, картинки и прочие уже
+    сжатые форматы пропускаются, а потоковые ответы сжимаются по кускам,
+    не задерживая уже готовую часть страницы. Размер потока без
+    Content-Length проверяется по первым кускам."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if not ACCEPTS_GZIP_RE.search(accepted):
+            return response
+        if response.streaming:
+            if not self.compress_streaming(response):
+                return response
+        elif not self.compress_content(response):
+            return response
+        # Сжатое тело другое, поэтому сильный ETag становится слабым
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = 'gzip'
+        return response
+
+    def compress_content(self, response):
+        content = response.content
+        if len(content) < settings.GZIP_MIN_BYTES:
+            return False
+        start = time.perf_counter()
+        packed = compress(content, settings.GZIP_LEVEL)
+        elapsed = time.perf_counter() - start
+        record(len(content), len(packed), elapsed)
+        if len(packed) >= len(content):
+            return False
+        response.content = packed
+        response['Content-Length'] = str(len(packed))
+        return True
+
+    def compress_streaming(self, response):
+        length = response.get('Content-Length')
+        if length is not None:
+            if int(length) < settings.GZIP_MIN_BYTES:
+                return False
+            chunks = response.streaming_content
+        else:
+            head, size, rest = peek(
+                response.streaming_content, settings.GZIP_MIN_BYTES
+            )
+            if size < settings.GZIP_MIN_BYTES:
+                response.streaming_content = head
+                return False
+            chunks = chain(head, rest)
+        response.streaming_content = compress_stream(
+            chunks, settings.GZIP_LEVEL
+        )
+        if length is not None:
+            del response['Content-Length']
+        return True
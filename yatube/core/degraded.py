@@ -0,0 +1,195 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from . import metrics
+from .querystats import route_name
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='revalidate')
+
+lock = threading.Lock()
+# Последнее сохранение копии и режим деградации по ключам, в процессе
+saved_at = OrderedDict()
+degraded_until = {}
+refreshing = set()
+
+MAX_TRACKED_KEYS = 10000
+
+
+@contextmanager
+def db_deadline(seconds):
+    """Ограничивает время SQL-запросов блока: ожидание блокировки
+    SQLite (busy_timeout) и само выполнение (progress handler прерывает
+    запрос с OperationalError). На других базах не ограничивает."""
+    connection.ensure_connection()
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    raw = connection.connection
+    deadline = time.monotonic() + seconds
+    busy_timeout = raw.execute('PRAGMA busy_timeout').fetchone()[0]
+    raw.execute(f'PRAGMA busy_timeout = {int(seconds * 1000)}')
+    raw.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+    try:
+        yield
+    finally:
+        raw.set_progress_handler(None, 0)
+        raw.execute(f'PRAGMA busy_timeout = {busy_timeout}')
+
+
+def page_number(request):
+    """Номер страницы из ?page=; всё, что не число, — первая страница,
+    как у Paginator.get_page()."""
+    page = request.GET.get('page', '')
+    return int(page) if page.isdigit() and int(page) > 1 else 1
+
+
+def stale_key(request, args, kwargs):
+    """Ключ копии: маршрут, его аргументы и номер страницы. Прочие
+    параметры запроса в ключ не входят, чтобы ?x=<случайное> не плодило
+    копии в общем кэше."""
+    arguments = [str(value) for value in args] + [
+        f'{name}={value}' for name, value in sorted(kwargs.items())
+    ]
+    return (
+        f'stale:{route_name(request)}:{"/".join(arguments)}:'
+        f'{page_number(request)}'
+    )
+
+
+def remember(key, response):
+    """Сохраняет удачную отрисовку не чаще раза в DEGRADED_SAVE_INTERVAL."""
+    now = time.monotonic()
+    with lock:
+        last = saved_at.get(key)
+        if last is not None and now - last < settings.DEGRADED_SAVE_INTERVAL:
+            return
+        saved_at[key] = now
+        saved_at.move_to_end(key)
+        while len(saved_at) > MAX_TRACKED_KEYS:
+            saved_at.popitem(last=False)
+    cache.set(
+        key,
+        (response.content, response['Content-Type'], time.time()),
+        settings.DEGRADED_CACHE_TTL,
+    )
+
+
+def stale_response(stored):
+    content, content_type, created = stored
+    response = HttpResponse(content, content_type=content_type)
+    response['Warning'] = '110 - "Response is Stale"'
+    response['Age'] = max(0, int(time.time() - created))
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def refresh_request(request):
+    """Копия запроса для фоновой перерисовки: исходный в это время ещё
+    проходит middleware главного потока. Из параметров остаётся только
+    номер страницы, как и в ключе копии, а пользователь — гость: копии
+    только гостевые."""
+    page = page_number(request)
+    fresh = RequestFactory().get(
+        request.path,
+        {'page': page} if page > 1 else {},
+        HTTP_HOST=request.get_host(),
+        secure=request.is_secure(),
+    )
+    fresh.user = AnonymousUser()
+    fresh.resolver_match = request.resolver_match
+    return fresh
+
+
+def refresh(view, request, args, kwargs, key):
+    """Фоновая перерисовка: при успехе обновляет копию и выводит
+    страницу из режима деградации."""
+    try:
+        with db_deadline(settings.DEGRADED_REFRESH_DEADLINE):
+            response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            with lock:
+                saved_at.pop(key, None)
+                degraded_until.pop(key, None)
+            remember(key, response)
+    except DatabaseError:
+        logger.warning('База всё ещё недоступна для %s', key)
+    finally:
+        with lock:
+            refreshing.discard(key)
+        connection.close()
+
+
+def schedule_refresh(view, request, args, kwargs, key):
+    with lock:
+        if key in refreshing:
+            return
+        refreshing.add(key)
+    executor.submit(
+        refresh, view, refresh_request(request), args, kwargs, key
+    )
+
+
+def serve_stale(view, request, args, kwargs, key, stored, reason):
+    metrics.degraded_responses.inc(route_name(request), reason)
+    schedule_refresh(view, request, args, kwargs, key)
+    return stale_response(stored)
+
+
+def stale_while_revalidate(view):
+    """GET-страница с запасной копией на время проблем с базой.
+
+    Удачные ответы гостям сохраняются в кэш: у гостевых страниц нет
+    форм с CSRF-токеном, и копий не больше, чем самих страниц. Если
+    копия есть, а запросы к базе не уложились в DEGRADED_DB_DEADLINE
+    или упали, отдаётся она с заголовком Warning: 110 — и гостю, и
+    вошедшему пользователю; страница на DEGRADED_COOLDOWN секунд
+    перестаёт ходить в базу, а в фоне её пытаются перерисовать. Без
+    копии отступать некуда, и запрос ждёт базу как обычно."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (not settings.DEGRADED_MODE_ENABLED
+                or request.method not in ('GET', 'HEAD')):
+            return view(request, *args, **kwargs)
+        key = stale_key(request, args, kwargs)
+        stored = cache.get(key)
+        if stored is None:
+            response = view(request, *args, **kwargs)
+        else:
+            with lock:
+                cooling = degraded_until.get(key, 0) > time.monotonic()
+            if cooling:
+                return serve_stale(
+                    view, request, args, kwargs, key, stored, 'cooldown'
+                )
+            try:
+                with db_deadline(settings.DEGRADED_DB_DEADLINE):
+                    response = view(request, *args, **kwargs)
+            except DatabaseError:
+                with lock:
+                    degraded_until[key] = (
+                        time.monotonic() + settings.DEGRADED_COOLDOWN
+                    )
+                return serve_stale(
+                    view, request, args, kwargs, key, stored, 'error'
+                )
+        if (response.status_code == 200 and not response.streaming
+                and not request.user.is_authenticated):
+            remember(key, response)
+        return response
+
+    return wrapper
@@ -0,0 +1,202 @@
+import json
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+import requests
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+)
+from django.db import connections
+from django.test import Client
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, rank):
+    """Процентиль по ближайшему рангу для отсортированного списка."""
+    index = max(0, math.ceil(rank / 100 * len(values)) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def session_key(user):
+    """Создаёт сессию пользователя в базе, как Client.force_login."""
+    engine = import_module(settings.SESSION_ENGINE)
+    session = engine.SessionStore()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return session.session_key
+
+
+class WsgiTransport:
+    """Запросы прямо в WSGI-приложение процесса через тестовый клиент."""
+
+    def __init__(self, session=None):
+        self.client = Client()
+        if session:
+            self.client.cookies[settings.SESSION_COOKIE_NAME] = session
+
+    def request(self, method, url, data=None):
+        return getattr(self.client, method)(url, data or {}).status_code
+
+    def close(self):
+        for connection in connections.all():
+            connection.close()
+
+
+class HttpTransport:
+    """Запросы к запущенному серверу; CSRF-токен подставляется сам."""
+
+    def __init__(self, base_url, session=None):
+        self.base_url = base_url.rstrip('/')
+        self.http = requests.Session()
+        self.csrf_token = get_random_string(64)
+        self.http.cookies[settings.CSRF_COOKIE_NAME] = self.csrf_token
+        if session:
+            self.http.cookies[settings.SESSION_COOKIE_NAME] = session
+
+    def request(self, method, url, data=None):
+        headers = {}
+        if method == 'post':
+            headers[settings.CSRF_HEADER_NAME[5:].replace('_', '-')] = (
+                self.csrf_token
+            )
+        response = self.http.request(
+            method, self.base_url + url, data=data, headers=headers,
+            allow_redirects=False,
+        )
+        return response.status_code
+
+    def close(self):
+        self.http.close()
+
+
+class LoadTest:
+    """Гоняет сценарий в пуле потоков. scenario(rng, logged_in)
+    возвращает (имя маршрута, метод, адрес, данные) для очередного
+    запроса; sessions — ключи сессий вошедших пользователей."""
+
+    def __init__(self, scenario, sessions, base_url=None, concurrency=4,
+                 anonymous=0.5, seed=None):
+        self.scenario = scenario
+        self.sessions = sessions
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.anonymous = anonymous if sessions else 1
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.remaining = None
+
+    def transport(self, rng):
+        session = None
+        if rng.random() >= self.anonymous:
+            session = rng.choice(self.sessions)
+        if self.base_url:
+            return HttpTransport(self.base_url, session), bool(session)
+        return WsgiTransport(session), bool(session)
+
+    def take(self):
+        with self.lock:
+            if self.remaining is None:
+                return True
+            self.remaining -= 1
+            return self.remaining >= 0
+
+    def worker(self, number, deadline):
+        rng = random.Random(f'{self.seed}:{number}')
+        transport, logged_in = self.transport(rng)
+        samples = defaultdict(list)
+        errors = defaultdict(int)
+        try:
+            while time.monotonic() < deadline and self.take():
+                name, method, url, data = self.scenario(rng, logged_in)
+                start = time.perf_counter()
+                try:
+                    status = transport.request(method, url, data)
+                except Exception:
+                    status = None
+                samples[name].append((time.perf_counter() - start) * 1000)
+                if status is None or status >= 500:
+                    errors[name] += 1
+        finally:
+            transport.close()
+        with self.lock:
+            for name, timings in samples.items():
+                self.samples[name].extend(timings)
+            for name, count in errors.items():
+                self.errors[name] += count
+
+    def run(self, duration=None, total=None):
+        """Работает duration секунд или до total запросов на всех."""
+        deadline = time.monotonic() + (duration or float('inf'))
+        self.remaining = total
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            for future in [
+                pool.submit(self.worker, number, deadline)
+                for number in range(self.concurrency)
+            ]:
+                future.result()
+        return self.report(time.perf_counter() - start)
+
+    def report(self, elapsed):
+        routes = {}
+        for name, timings in sorted(self.samples.items()):
+            timings.sort()
+            route = {
+                'requests': len(timings),
+                'errors': self.errors[name],
+                'rps': round(len(timings) / elapsed, 2),
+                'mean_ms': round(sum(timings) / len(timings), 2),
+            }
+            for rank in PERCENTILES:
+                route[f'p{rank}_ms'] = round(percentile(timings, rank), 2)
+            routes[name] = route
+        count = sum(route['requests'] for route in routes.values())
+        return {
+            'generated': timezone.now().isoformat(),
+            'target': self.base_url or 'wsgi',
+            'concurrency': self.concurrency,
+            'elapsed_s': round(elapsed, 2),
+            'requests': count,
+            'errors': sum(route['errors'] for route in routes.values()),
+            'rps': round(count / elapsed, 2) if elapsed else 0,
+            'routes': routes,
+        }
+
+
+def compare(report, baseline, tolerance):
+    """Список ухудшений относительно baseline: падение общего RPS
+    и рост p95 по маршрутам больше, чем на долю tolerance."""
+    problems = []
+    if report['rps'] < baseline['rps'] * (1 - tolerance):
+        problems.append(f'rps: {report["rps"]} < {baseline["rps"]}')
+    for name, route in report['routes'].items():
+        old = baseline['routes'].get(name)
+        if old and route['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            problems.append(
+                f'{name}: p95 {route["p95_ms"]} мс > {old["p95_ms"]} мс'
+            )
+    return problems
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as report_file:
+        return json.load(report_file)
+
+
+def save_report(path, report):
+    with open(path, 'w', encoding='utf-8') as report_file:
+        json.dump(report, report_file, ensure_ascii=False, indent=2)
+        report_file.write('\n')
@@ -0,0 +1,62 @@
+import json
+import os
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import memory
+
+
+class Command(BaseCommand):
+    help = (
+        'Просит работающий процесс сделать снимок tracemalloc (сигналом '
+        'MEMORY_SIGNAL) и печатает его отчёт. Первый вызов для процесса '
+        'только включает tracemalloc, сравнение появится с третьего.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('pid', type=int, help='PID процесса-воркера')
+        parser.add_argument(
+            '--timeout', type=float, default=10,
+            help='Сколько секунд ждать отчёта',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.MEMORY_SIGNAL:
+            raise CommandError('MEMORY_SIGNAL не задан')
+        path = memory.report_path(options['pid'])
+        before = os.path.getmtime(path) if os.path.exists(path) else None
+        try:
+            os.kill(options['pid'], getattr(signal, settings.MEMORY_SIGNAL))
+        except ProcessLookupError:
+            raise CommandError(f'Нет процесса {options["pid"]}')
+        deadline = time.monotonic() + options['timeout']
+        while time.monotonic() < deadline:
+            if os.path.exists(path) and os.path.getmtime(path) != before:
+                break
+            time.sleep(0.1)
+        else:
+            raise CommandError('Процесс не прислал отчёт')
+        with open(path) as report_file:
+            report = json.load(report_file)
+        self.print_report(report)
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'PID {report["pid"]}: RSS {report["rss"]["current"]}, '
+            f'tracemalloc {report["traced"]["current"]}'
+        )
+        for cache in report['caches']:
+            self.stdout.write(
+                f'{cache["name"]:<24}{cache["backend"]:<32}'
+                f'{cache["entries"]!s:>8}{cache["bytes"]!s:>12}'
+            )
+        for title, key, field in (
+            ('Рост', 'diff', 'size_diff'), ('Топ', 'top', 'size'),
+        ):
+            if report[key]:
+                self.stdout.write(title)
+            for site in report[key]:
+                self.stdout.write(f'{site[field]:>12}  {site["site"]}')
@@ -0,0 +1,88 @@
+import json
+import os
+import subprocess
+import sys
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+Import = namedtuple('Import', 'module self_us cumulative_us depth')
+
+
+def parse_importtime(output):
+    """Строки вида 'import time: self [us] | cumulative | imported package'
+    из вывода python -X importtime."""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append(Import(
+            name.strip(), int(self_us), int(cumulative_us), depth
+        ))
+    return imports
+
+
+class Command(BaseCommand):
+    help = (
+        'Отчёт о запуске воркера в чистом интерпретаторе: время импортов, '
+        'import_models и ready() по приложениям, загрузки WSGI и прогрева'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int, default=20,
+            help='Сколько самых медленных импортов показать',
+        )
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-m', 'core.startup'],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr[-2000:])
+        report = json.loads(result.stdout)
+        imports = parse_importtime(result.stderr)
+        top_level = [item for item in imports if item.depth == 0]
+        report['imports'] = {
+            'total_ms': round(
+                sum(item.cumulative_us for item in top_level) / 1000, 2
+            ),
+            'modules': [
+                item._asdict() for item in sorted(
+                    imports, key=lambda item: item.cumulative_us,
+                    reverse=True,
+                )[:options['top']]
+            ],
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+    def print_report(self, report):
+        self.stdout.write('Фазы, мс:')
+        for name, ms in report['phases'].items():
+            self.stdout.write(f'  {name:<24}{ms:>10}')
+        self.stdout.write('Приложения (import_models / ready), мс:')
+        for label, timings in report['apps'].items():
+            self.stdout.write(
+                f'  {label:<24}{timings.get("import_models", 0):>10}'
+                f'{timings.get("ready", 0):>10}'
+            )
+        self.stdout.write('Прогрев, мс:')
+        for name, ms in report['warmup'].items():
+            self.stdout.write(f'  {name:<24}{ms:>10}')
+        imports = report['imports']
+        self.stdout.write(f'Импорты всего: {imports["total_ms"]} мс')
+        for item in imports['modules']:
+            self.stdout.write(
+                f'  {item["cumulative_us"] / 1000:>10.2f}'
+                f'{item["self_us"] / 1000:>10.2f}  {item["module"]}'
+            )
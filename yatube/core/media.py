@@ -0,0 +1,89 @@
+import os
+import re
+import tempfile
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.utils._os import safe_join
+from PIL import Image, ImageOps
+
+from . import metrics, tracing
+
+GEOMETRY_RE = re.compile(r'^(?P<width>\d{1,4})x(?P<height>\d{1,4})$')
+
+signer = signing.Signer(salt='core.media.resize')
+
+
+def parse_geometry(geometry):
+    match = GEOMETRY_RE.match(geometry)
+    if match is None:
+        raise ValueError(f'Некорректный размер: {geometry}')
+    width, height = int(match['width']), int(match['height'])
+    if not (0 < width <= settings.RESIZE_MAX_SIZE
+            and 0 < height <= settings.RESIZE_MAX_SIZE):
+        raise ValueError(f'Недопустимый размер: {geometry}')
+    return width, height
+
+
+def sign(geometry, path):
+    return signer.signature(f'{geometry}/{path}')
+
+
+def check_signature(signature, geometry, path):
+    return constant_time_compare(signature, sign(geometry, path))
+
+
+def resize_url(path, geometry):
+    return reverse('resize', kwargs={
+        'signature': sign(geometry, path),
+        'geometry': geometry,
+        'path': path,
+    })
+
+
+def cache_root():
+    return settings.RESIZE_CACHE_ROOT or os.path.join(
+        settings.MEDIA_ROOT, 'resize'
+    )
+
+
+def cache_path(geometry, path):
+    return safe_join(cache_root(), geometry, path)
+
+
+def render_variant(source, destination, size):
+    """Вписывает картинку в size с обрезкой по центру
+    (как crop="center" upscale=True у sorl) и атомарно кладёт в кэш."""
+    with Image.open(source) as image:
+        variant = ImageOps.fit(image.convert('RGB'), size, Image.ANTIALIAS)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(destination))
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            variant.save(
+                tmp, 'JPEG', quality=settings.RESIZE_QUALITY, progressive=True
+            )
+        os.replace(tmp_path, destination)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def get_variant(geometry, path):
+    """Возвращает путь к готовому варианту, создавая его при промахе."""
+    size = parse_geometry(geometry)
+    destination = cache_path(geometry, path)
+    if os.path.exists(destination):
+        metrics.image_variant_requests.inc('hit')
+        return destination
+    start = time.perf_counter()
+    with tracing.span('thumbnail', geometry=geometry, path=path):
+        render_variant(
+            safe_join(settings.MEDIA_ROOT, path), destination, size
+        )
+    metrics.image_variants.observe(time.perf_counter() - start, geometry)
+    metrics.image_variant_requests.inc('miss')
+    return destination
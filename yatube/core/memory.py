@@ -0,0 +1,220 @@
+import json
+import linecache
+import logging
+import os
+import resource
+import signal
+import tempfile
+import threading
+import tracemalloc
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template import engines
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+lock = threading.Lock()
+snapshots = deque(maxlen=2)
+
+# Сигнал только взводит событие, а отчёт пишет поток reporter: в самом
+# обработчике нельзя брать lock и ходить в кэш — сигнал может прийти,
+# пока главный поток их держит
+report_requested = threading.Event()
+reporter = None
+
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+)
+
+
+def start():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(settings.MEMORY_TRACE_FRAMES)
+
+
+def stop():
+    with lock:
+        snapshots.clear()
+    tracemalloc.stop()
+
+
+def take_snapshot():
+    """Снимок выделений памяти; хранятся два последних для сравнения."""
+    snapshot = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+    with lock:
+        snapshots.append((timezone.now(), snapshot))
+    return snapshot
+
+
+def describe(statistic):
+    frame = statistic.traceback[0]
+    return {
+        'site': f'{frame.filename}:{frame.lineno}',
+        'size': statistic.size,
+        'count': statistic.count,
+        'size_diff': getattr(statistic, 'size_diff', None),
+        'count_diff': getattr(statistic, 'count_diff', None),
+    }
+
+
+def top(limit=None):
+    """Главные места выделения в последнем снимке и рост относительно
+    предыдущего снимка."""
+    limit = limit or settings.MEMORY_TOP
+    with lock:
+        taken = list(snapshots)
+    if not taken:
+        return {'top': [], 'diff': []}
+    created, snapshot = taken[-1]
+    result = {
+        'created': created.isoformat(),
+        'top': [
+            describe(statistic)
+            for statistic in snapshot.statistics('lineno')[:limit]
+        ],
+        'diff': [],
+    }
+    if len(taken) > 1:
+        previous_created, previous = taken[0]
+        result['diff_since'] = previous_created.isoformat()
+        result['diff'] = [
+            describe(statistic)
+            for statistic in snapshot.compare_to(previous, 'lineno')[:limit]
+        ]
+    return result
+
+
+def cache_sizes():
+    """Размеры кэшей: записи и байты каждого алиаса (по уровням, если
+    бэкенд умеет sizes()) и число шаблонов в кэширующих загрузчиках."""
+    sizes = []
+    for alias in settings.CACHES:
+        backend = caches[alias]
+        if hasattr(backend, 'sizes'):
+            sizes.extend(
+                {
+                    'name': f'cache:{alias}:{tier}',
+                    'backend': type(backend).__name__,
+                    'entries': entries,
+                    'bytes': size,
+                }
+                for tier, entries, size in backend.sizes()
+            )
+            continue
+        store = getattr(backend, '_cache', None)
+        entry = {
+            'name': f'cache:{alias}',
+            'backend': type(backend).__name__,
+            'entries': None,
+            'bytes': None,
+        }
+        if isinstance(store, dict):
+            items = list(store.items())
+            entry['entries'] = len(items)
+            entry['bytes'] = sum(
+                len(key) + len(value) for key, value in items
+            )
+        sizes.append(entry)
+    for engine in engines.all():
+        loaders = getattr(getattr(engine, 'engine', None),
+                          'template_loaders', [])
+        for loader in loaders:
+            templates = getattr(loader, 'get_template_cache', None)
+            if templates is not None:
+                sizes.append({
+                    'name': f'templates:{engine.name}',
+                    'backend': type(loader).__module__,
+                    'entries': len(templates),
+                    'bytes': None,
+                })
+    return sizes
+
+
+def cache_compression():
+    return [
+        {'name': f'cache:{alias}', **caches[alias].compression_stats()}
+        for alias in settings.CACHES
+        if hasattr(caches[alias], 'compression_stats')
+    ]
+
+
+def rss():
+    """Текущий и пиковый размер процесса в байтах."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        current = pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        current = None
+    return {'current': current, 'peak': peak}
+
+
+def report():
+    traced = (0, 0)
+    if tracemalloc.is_tracing():
+        traced = tracemalloc.get_traced_memory()
+    return {
+        'pid': os.getpid(),
+        'tracing': tracemalloc.is_tracing(),
+        'traced': {'current': traced[0], 'peak': traced[1]},
+        'rss': rss(),
+        'caches': cache_sizes(),
+        'compression': cache_compression(),
+        **top(),
+    }
+
+
+def report_path(pid):
+    return os.path.join(settings.MEMORY_REPORT_DIR, f'{pid}.json')
+
+
+def write_report():
+    """Первый вызов включает tracemalloc, каждый следующий делает
+    снимок; отчёт пишется в MEMORY_REPORT_DIR/<pid>.json."""
+    if tracemalloc.is_tracing():
+        take_snapshot()
+    else:
+        start()
+    os.makedirs(settings.MEMORY_REPORT_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=settings.MEMORY_REPORT_DIR)
+    with os.fdopen(fd, 'w') as report_file:
+        json.dump(report(), report_file, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, report_path(os.getpid()))
+
+
+def serve_reports():
+    while True:
+        report_requested.wait()
+        report_requested.clear()
+        try:
+            write_report()
+        except Exception:
+            logger.exception('Не удалось записать отчёт о памяти')
+
+
+def handle_signal(signum, frame):
+    report_requested.set()
+
+
+def install_signal_handler():
+    global reporter
+    name = settings.MEMORY_SIGNAL
+    if not name:
+        return
+    try:
+        signal.signal(getattr(signal, name), handle_signal)
+    except ValueError:
+        # Обработчик ставится только из главного потока
+        return
+    if reporter is None:
+        reporter = threading.Thread(
+            target=serve_reports, name='memory-reporter', daemon=True
+        )
+        reporter.start()
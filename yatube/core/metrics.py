@@ -0,0 +1,279 @@
+import bisect
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+from .querystats import route_name
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+SIZE_BUCKETS = tuple(2 ** power for power in range(10, 26, 2))
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dump(self):
+        with self.lock:
+            return {
+                json.dumps(key): value for key, value in self.values.items()
+            }
+
+    @staticmethod
+    def merge(total, value):
+        return (total or 0) + value
+
+    def samples(self, values):
+        for labels, value in sorted(values.items()):
+            yield self.name, labels, value
+
+
+class Histogram(Counter):
+    """Значение по меткам — [счётчики корзин..., сумма, количество]."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def dump(self):
+        with self.lock:
+            return {
+                json.dumps(key): list(value)
+                for key, value in self.values.items()
+            }
+
+    @staticmethod
+    def merge(total, value):
+        if total is None:
+            return list(value)
+        return [left + right for left, right in zip(total, value)]
+
+    def samples(self, values):
+        for labels, entry in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                yield (f'{self.name}_bucket', labels + (('le', bound),),
+                       cumulative)
+            yield f'{self.name}_bucket', labels + (('le', '+Inf'),), entry[-1]
+            yield f'{self.name}_sum', labels, entry[-2]
+            yield f'{self.name}_count', labels, entry[-1]
+
+
+class Registry:
+    """Метрики процесса. Если задан METRICS_MULTIPROC_DIR, каждый
+    процесс периодически сбрасывает свои значения в файл <pid>.json,
+    а /metrics складывает файлы всех процессов."""
+
+    def __init__(self):
+        self.metrics = {}
+        self.last_flush = 0
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def dump(self):
+        return {name: metric.dump() for name, metric in self.metrics.items()}
+
+    def flush(self, force=False):
+        directory = settings.METRICS_MULTIPROC_DIR
+        now = time.monotonic()
+        interval = settings.METRICS_FLUSH_INTERVAL
+        if not directory or (not force and now - self.last_flush < interval):
+            return
+        self.last_flush = now
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as tmp:
+            json.dump(self.dump(), tmp)
+        os.replace(tmp_path, os.path.join(directory, f'{os.getpid()}.json'))
+
+    def collect(self):
+        """Значения всех процессов: {имя метрики: {метки: значение}}."""
+        directory = settings.METRICS_MULTIPROC_DIR
+        if directory:
+            self.flush(force=True)
+            dumps = []
+            for path in glob.glob(os.path.join(directory, '*.json')):
+                with open(path) as dump_file:
+                    dumps.append(json.load(dump_file))
+        else:
+            dumps = [self.dump()]
+        merged = {}
+        for dump in dumps:
+            for name, values in dump.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                target = merged.setdefault(name, {})
+                for key, value in values.items():
+                    labels = tuple(zip(metric.labels, json.loads(key)))
+                    target[labels] = metric.merge(target.get(labels), value)
+        return merged
+
+    def render(self):
+        lines = []
+        collected = self.collect()
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for sample, labels, value in metric.samples(
+                collected.get(name, {})
+            ):
+                lines.append(f'{sample}{format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'),
+        )
+        for name, value in labels
+    )
+    return '{' + pairs + '}'
+
+
+registry = Registry()
+
+request_duration = registry.register(Histogram(
+    'yatube_http_request_duration_seconds',
+    'Время ответа по маршруту и статусу',
+    labels=('route', 'method', 'status'),
+))
+db_duration = registry.register(Histogram(
+    'yatube_db_duration_seconds',
+    'Время SQL-запросов за один HTTP-запрос',
+    labels=('route',),
+))
+db_queries = registry.register(Counter(
+    'yatube_db_queries_total',
+    'Число SQL-запросов',
+    labels=('route',),
+))
+cache_requests = registry.register(Counter(
+    'yatube_cache_requests_total',
+    'Обращения к кэшу по фрагменту шаблона и результату',
+    labels=('fragment', 'result'),
+))
+cache_tiers = registry.register(Counter(
+    'yatube_cache_tier_requests_total',
+    'Чтения двухуровневого кэша по уровню и результату',
+    labels=('tier', 'result'),
+))
+cache_compression_bytes = registry.register(Counter(
+    'yatube_cache_compression_bytes_total',
+    'Байты сжатых значений кэша до (raw) и после (stored) сжатия',
+    labels=('stage',),
+))
+cache_compression_seconds = registry.register(Counter(
+    'yatube_cache_compression_seconds_total',
+    'Время процессора на сжатие и распаковку значений кэша',
+    labels=('operation',),
+))
+response_compression_bytes = registry.register(Counter(
+    'yatube_response_compression_bytes_total',
+    'Байты ответов, сжатых gzip, до (raw) и после (sent) сжатия',
+    labels=('stage',),
+))
+response_compression_seconds = registry.register(Counter(
+    'yatube_response_compression_seconds_total',
+    'Время процессора на сжатие ответов gzip',
+))
+cache_recomputes = registry.register(Counter(
+    'yatube_cache_recompute_total',
+    'Исход чтения через get_or_recompute: fresh — из кэша, missing и '
+    'recomputed — пересчитано, stale — отдано прежнее значение, waited — '
+    'дождались чужого пересчёта, timeout — не дождались',
+    labels=('result',),
+))
+degraded_responses = registry.register(Counter(
+    'yatube_degraded_responses_total',
+    'Страницы, отданные из запасной копии: error — база не ответила, '
+    'cooldown — база пропущена после недавней ошибки',
+    labels=('route', 'reason'),
+))
+image_variants = registry.register(Histogram(
+    'yatube_image_variant_seconds',
+    'Время подготовки миниатюры',
+    labels=('geometry',),
+))
+image_variant_requests = registry.register(Counter(
+    'yatube_image_variant_requests_total',
+    'Запросы миниатюр: hit — уже в кэше, miss — созданы заново',
+    labels=('result',),
+))
+upload_size = registry.register(Histogram(
+    'yatube_upload_size_bytes',
+    'Размер загруженных файлов',
+    labels=('kind',),
+    buckets=SIZE_BUCKETS,
+))
+
+FRAGMENT_PREFIX = 'template.cache.'
+
+
+def fragment_name(key):
+    """'template.cache.index_page.<хэш>' -> 'index_page'."""
+    if key.startswith(FRAGMENT_PREFIX):
+        return key[len(FRAGMENT_PREFIX):].split('.', 1)[0]
+    return 'other'
+
+
+class MetricsMiddleware:
+    """Время ответа и время БД по маршрутам. Время БД берётся
+    у QueryStatsMiddleware, которая должна стоять глубже в списке."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        route = route_name(request)
+        request_duration.observe(
+            time.perf_counter() - start,
+            route, request.method, str(response.status_code),
+        )
+        recorder = getattr(request, 'db_recorder', None)
+        if recorder is not None:
+            db_duration.observe(recorder.duration, route)
+            db_queries.inc(route, amount=recorder.count)
+        registry.flush()
+        return response
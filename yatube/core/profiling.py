@@ -0,0 +1,223 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+
+from .querystats import route_name
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_ID_RE = re.compile(r'^\d{14}-[0-9a-f]{8}$')
+
+
+def folded(frame):
+    """Стек кадра в формате folded (корень;...;лист) для flamegraph.pl
+    и speedscope."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{frame.f_globals.get("__name__", "?")}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler:
+    """Раз в interval секунд снимает стек потока thread_id из
+    sys._current_frames() и считает одинаковые стеки."""
+
+    mode = 'sampling'
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name='profiler', daemon=True
+        )
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[folded(frame)] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def save(self, base_path):
+        with open(base_path + '.folded', 'w') as folded_file:
+            for stack, count in self.stacks.most_common():
+                folded_file.write(f'{stack} {count}\n')
+        return {'samples': sum(self.stacks.values())}
+
+
+class Tracer:
+    """Детерминированный профиль cProfile: точнее по числу вызовов,
+    но заметно замедляет запрос."""
+
+    mode = 'cprofile'
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def save(self, base_path):
+        self.profile.dump_stats(base_path + '.prof')
+        output = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=output)
+        stats.sort_stats('cumulative').print_stats(40)
+        with open(base_path + '.folded', 'w') as folded_file:
+            for (filename, line, name), row in stats.stats.items():
+                # Собственное время функции в микросекундах; стек из
+                # одного кадра, т.к. cProfile не хранит полных стеков
+                folded_file.write(
+                    f'{os.path.basename(filename)}:{name} '
+                    f'{max(1, round(row[2] * 1e6))}\n'
+                )
+        return {'summary': output.getvalue()}
+
+
+def profile_dir():
+    return settings.PROFILER_DIR
+
+
+def profile_path(profile_id):
+    return os.path.join(profile_dir(), profile_id)
+
+
+def store(profiler, request, response, duration, trigger):
+    profile_id = (
+        f'{timezone.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}'
+    )
+    os.makedirs(profile_dir(), exist_ok=True)
+    meta = {
+        'id': profile_id,
+        'created': timezone.now().isoformat(),
+        'mode': profiler.mode,
+        'trigger': trigger,
+        'route': route_name(request),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 2),
+        'user': getattr(getattr(request, 'user', None), 'username', ''),
+    }
+    meta.update(profiler.save(profile_path(profile_id)))
+    with open(profile_path(profile_id) + '.json', 'w') as meta_file:
+        json.dump(meta, meta_file, ensure_ascii=False)
+    prune()
+    return profile_id
+
+
+def prune():
+    """Оставляет PROFILER_KEEP последних профилей."""
+    ids = sorted(list_ids(), reverse=True)
+    for profile_id in ids[settings.PROFILER_KEEP:]:
+        for suffix in ('.json', '.folded', '.prof'):
+            try:
+                os.unlink(profile_path(profile_id) + suffix)
+            except FileNotFoundError:
+                pass
+
+
+def list_ids():
+    try:
+        names = os.listdir(profile_dir())
+    except FileNotFoundError:
+        return []
+    return [name[:-5] for name in names if name.endswith('.json')]
+
+
+def list_profiles():
+    profiles = []
+    for profile_id in sorted(list_ids(), reverse=True):
+        meta = load(profile_id)
+        if meta is not None:
+            profiles.append(meta)
+    return profiles
+
+
+def load(profile_id):
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    try:
+        with open(profile_path(profile_id) + '.json') as meta_file:
+            return json.load(meta_file)
+    except FileNotFoundError:
+        return None
+
+
+def read_folded(profile_id):
+    with open(profile_path(profile_id) + '.folded') as folded_file:
+        return folded_file.read()
+
+
+class ProfilingMiddleware:
+    """Профилирует запрос, если сотрудник прислал заголовок X-Profile
+    ('1' — семплирующий профилировщик, 'cprofile' — cProfile), или
+    случайную долю PROFILER_SAMPLE_RATE запросов; такие профили
+    сохраняются, только если запрос медленнее PROFILER_THRESHOLD_MS."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trigger = self.trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+        if request.META.get(PROFILE_HEADER) == 'cprofile':
+            profiler = Tracer()
+        else:
+            profiler = Sampler(
+                threading.get_ident(), settings.PROFILER_INTERVAL
+            )
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+        duration = time.perf_counter() - start
+        if trigger == 'sample' and (
+            duration * 1000 < settings.PROFILER_THRESHOLD_MS
+            or not self.route_allowed(request)
+        ):
+            return response
+        response['X-Profile-Id'] = store(
+            profiler, request, response, duration, trigger
+        )
+        return response
+
+    def trigger(self, request):
+        if request.META.get(PROFILE_HEADER):
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_staff:
+                return 'header'
+        rate = settings.PROFILER_SAMPLE_RATE
+        if rate and random.random() < rate:
+            return 'sample'
+        return None
+
+    def route_allowed(self, request):
+        routes = settings.PROFILER_ROUTES
+        return not routes or route_name(request) in routes
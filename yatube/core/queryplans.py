@@ -0,0 +1,92 @@
+import json
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .querystats import fingerprint
+
+# Признаки плохого плана в выводе EXPLAIN QUERY PLAN SQLite
+FULL_SCAN = 'full scan'
+TEMP_BTREE = 'temp b-tree'
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def problems(plan):
+    found = []
+    for step in plan:
+        words = step.split()
+        if (words[0] == 'SCAN' and 'USING' not in words
+                and 'VIRTUAL' not in words and 'CONSTANT' not in words):
+            found.append(f'{FULL_SCAN}: {step}')
+        if step.startswith('USE TEMP B-TREE'):
+            found.append(f'{TEMP_BTREE}: {step}')
+    return found
+
+
+def capture_plans(request):
+    """Выполняет request() и возвращает {отпечаток: план} для всех
+    SELECT-запросов, которые при этом ушли в базу."""
+    with CaptureQueriesContext(connection) as queries:
+        request()
+    plans = {}
+    for query in queries.captured_queries:
+        sql = query['sql']
+        if not sql.lstrip().upper().startswith('SELECT'):
+            continue
+        plans.setdefault(fingerprint(sql), explain(sql))
+    return plans
+
+
+def compare(case, plans, baseline):
+    """Сравнивает планы страницы с эталоном. Проблемный план допустим,
+    только если в эталоне для запроса указана причина в 'allow'."""
+    errors = []
+    expected = baseline.get(case, {})
+    for sql, plan in plans.items():
+        entry = expected.get(sql)
+        if entry is None:
+            errors.append(f'{case}: новый запрос без эталона: {sql}')
+            continue
+        if plan != entry['plan']:
+            errors.append(
+                f'{case}: план изменился: {sql}\n'
+                f'  было: {entry["plan"]}\n  стало: {plan}'
+            )
+        if problems(plan) and not entry.get('allow'):
+            errors.append(f'{case}: {"; ".join(problems(plan))}: {sql}')
+    return errors
+
+
+def build_baseline(results, old_baseline):
+    baseline = {}
+    for case, plans in results.items():
+        old = old_baseline.get(case, {})
+        baseline[case] = {}
+        for sql, plan in sorted(plans.items()):
+            entry = {'plan': plan}
+            if problems(plan) and old.get(sql, {}).get('allow'):
+                entry['allow'] = old[sql]['allow']
+            baseline[case][sql] = entry
+    return baseline
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as baseline_file:
+            return json.load(baseline_file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path, baseline):
+    with open(path, 'w', encoding='utf-8') as baseline_file:
+        json.dump(
+            baseline, baseline_file, ensure_ascii=False, indent=2,
+            sort_keys=True,
+        )
+        baseline_file.write('\n')
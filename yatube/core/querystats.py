@@ -0,0 +1,157 @@
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+FINGERPRINT_RULES = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\bIN\s*\((?:\s*\?\s*,?)+\)', re.IGNORECASE), 'IN (...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+def fingerprint(sql):
+    """Приводит SQL к виду без литералов и параметров, чтобы одинаковые
+    по структуре запросы складывались в одну строку статистики."""
+    for pattern, replacement in FINGERPRINT_RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+class QueryRecorder:
+    """execute_wrapper, запоминающий SQL и длительность каждого запроса."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for sql, duration in self.queries)
+
+
+class QueryStats:
+    """Накопительная статистика в памяти процесса в духе
+    pg_stat_statements: по отпечаткам запросов и по именам URL."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.queries = {}
+            self.views = defaultdict(lambda: {
+                'requests': 0,
+                'queries': 0,
+                'max_queries': 0,
+                'db_ms': 0.0,
+            })
+
+    def record(self, view_name, recorder):
+        with self.lock:
+            view = self.views[view_name]
+            view['requests'] += 1
+            view['queries'] += recorder.count
+            view['max_queries'] = max(view['max_queries'], recorder.count)
+            view['db_ms'] += recorder.duration * 1000
+            for sql, duration in recorder.queries:
+                self._add_query(view_name, sql, duration * 1000)
+
+    def _add_query(self, view_name, sql, duration):
+        key = fingerprint(sql)
+        entry = self.queries.get(key)
+        if entry is None:
+            if len(self.queries) >= settings.QUERY_STATS_MAX_FINGERPRINTS:
+                rarest = min(
+                    self.queries, key=lambda k: self.queries[k]['calls']
+                )
+                del self.queries[rarest]
+            entry = self.queries[key] = {
+                'fingerprint': key,
+                'calls': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'views': set(),
+            }
+        entry['calls'] += 1
+        entry['total_ms'] += duration
+        entry['max_ms'] = max(entry['max_ms'], duration)
+        entry['views'].add(view_name)
+
+    def top(self, limit=None, order_by='total_ms'):
+        with self.lock:
+            entries = [
+                dict(entry, views=sorted(entry['views']),
+                     mean_ms=entry['total_ms'] / entry['calls'])
+                for entry in self.queries.values()
+            ]
+        entries.sort(key=lambda entry: entry[order_by], reverse=True)
+        return entries[:limit or settings.QUERY_STATS_TOP]
+
+    def by_view(self):
+        with self.lock:
+            views = [
+                dict(stats, view_name=name,
+                     mean_queries=stats['queries'] / stats['requests'])
+                for name, stats in self.views.items()
+            ]
+        views.sort(key=lambda view: view['db_ms'], reverse=True)
+        return views
+
+
+stats = QueryStats()
+
+UNRESOLVED = '<unresolved>'
+
+
+def route_name(request):
+    """Имя маршрута по пространству имён приложения ('posts:index'),
+    не зависящее от instance namespace в корневом urls.py."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNRESOLVED
+    return ':'.join(match.app_names + [match.url_name or match.view_name])
+
+
+class QueryStatsMiddleware:
+    """Считает запросы и время БД для каждого HTTP-запроса, копит
+    статистику по отпечаткам и отдаёт её в заголовке Server-Timing."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_STATS_ENABLED:
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+        stats.record(route_name(request), recorder)
+        request.db_recorder = recorder
+        response['Server-Timing'] = (
+            f'db;dur={recorder.duration * 1000:.2f};'
+            f'desc="{recorder.count} queries", '
+            f'total;dur={total * 1000:.2f}'
+        )
+        return response
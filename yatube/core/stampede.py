@@ -0,0 +1,116 @@
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+
+from . import cache_tags, metrics
+
+
+def store(cache, key, value, delta, timeout, signature):
+    # Запись живёт дольше timeout на CACHE_STALE_TTL, чтобы ожидающим
+    # было что отдать, пока один процесс пересчитывает значение. Подпись
+    # тегов хранится в записи, а не в ключе: после invalidate() прежнее
+    # значение остаётся под тем же ключом и достаётся ожидающим
+    cache.set(
+        key, (value, delta, time.time() + timeout, signature),
+        timeout + settings.CACHE_STALE_TTL,
+    )
+
+
+def recompute(cache, key, compute, timeout, signature):
+    start = time.perf_counter()
+    value = compute()
+    store(cache, key, value, time.perf_counter() - start, timeout, signature)
+    return value
+
+
+def is_fresh(entry, signature):
+    """Свежа ли запись (value, delta, expires, signature): теги не
+    сбрасывались, и срок не вышел с учётом XFetch."""
+    if entry is None:
+        return False
+    value, delta, expires, stored_signature = entry
+    if stored_signature != signature:
+        return False
+    jitter = -delta * settings.CACHE_EARLY_BETA * math.log(
+        1 - random.random()
+    )
+    return time.time() + jitter < expires
+
+
+def wait_for(cache, key, entry, compute):
+    """Значение для того, кому не досталась блокировка пересчёта."""
+    if entry is not None:
+        metrics.cache_recomputes.inc('stale')
+        return entry[0]
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            metrics.cache_recomputes.inc('waited')
+            return entry[0]
+    metrics.cache_recomputes.inc('timeout')
+    return compute()
+
+
+def get_or_recompute(key, compute, timeout, cache=None, tags=()):
+    """Значение из кэша или compute() без лавины пересчётов.
+
+    Запись считается устаревшей чуть раньше срока с вероятностью, растущей
+    к концу срока и пропорциональной времени пересчёта (XFetch), так что
+    один из запросов успевает обновить её заранее. Пересчитывает только
+    тот, кто взял блокировку cache.add(); остальные получают прежнее
+    значение, а при холодном кэше ждут до CACHE_LOCK_WAIT секунд.
+    С tags запись устаревает после cache_tags.invalidate() любого из
+    тегов, но до пересчёта ожидающие получают прежнее значение."""
+    cache = cache or default_cache
+    signature = cache_tags.signature(tags, cache)
+    entry = cache.get(key)
+    if is_fresh(entry, signature):
+        metrics.cache_recomputes.inc('fresh')
+        return entry[0]
+    lock_key = f'{key}.lock'
+    if cache.add(lock_key, 1, settings.CACHE_LOCK_TIMEOUT):
+        metrics.cache_recomputes.inc(
+            'missing' if entry is None else 'recomputed'
+        )
+        try:
+            return recompute(cache, key, compute, timeout, signature)
+        finally:
+            cache.delete(lock_key)
+    return wait_for(cache, key, entry, compute)
+
+
+def stream_or_recompute(key, chunks, timeout, cache=None, tags=()):
+    """Как get_or_recompute, но для строки из кусков: chunks() — генератор
+    кусков. Пересчитывающий отдаёт куски по мере готовности и кладёт
+    в кэш их склейку; остальные получают значение целиком."""
+    cache = cache or default_cache
+    signature = cache_tags.signature(tags, cache)
+    entry = cache.get(key)
+    if is_fresh(entry, signature):
+        metrics.cache_recomputes.inc('fresh')
+        yield entry[0]
+        return
+    lock_key = f'{key}.lock'
+    if cache.add(lock_key, 1, settings.CACHE_LOCK_TIMEOUT):
+        metrics.cache_recomputes.inc(
+            'missing' if entry is None else 'recomputed'
+        )
+        try:
+            start = time.perf_counter()
+            parts = []
+            for chunk in chunks():
+                parts.append(chunk)
+                yield chunk
+            store(
+                cache, key, ''.join(parts), time.perf_counter() - start,
+                timeout, signature,
+            )
+        finally:
+            cache.delete(lock_key)
+        return
+    yield wait_for(cache, key, entry, lambda: ''.join(chunks()))
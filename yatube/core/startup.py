@@ -0,0 +1,68 @@
+"""Замер запуска в чистом интерпретаторе:
+
+    python -X importtime -m core.startup
+
+печатает в stdout JSON с длительностью фаз django.setup() по приложениям,
+загрузки WSGI-приложения и шагов прогрева, а -X importtime пишет время
+импорта модулей в stderr. Запускается командой startup_report."""
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+
+def timed(timings, name, function):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timings[name] += (time.perf_counter() - start) * 1000
+    return wrapper
+
+
+def measure():
+    phases = {}
+    apps = defaultdict(lambda: defaultdict(float))
+    start = time.perf_counter()
+    import django
+    from django.apps.config import AppConfig
+    phases['import_django'] = time.perf_counter() - start
+
+    create = AppConfig.create.__func__
+
+    def create_timed(cls, entry):
+        config = create(cls, entry)
+        for method in ('import_models', 'ready'):
+            setattr(config, method, timed(
+                apps[config.label], method, getattr(config, method)
+            ))
+        return config
+
+    AppConfig.create = classmethod(create_timed)
+    start = time.perf_counter()
+    django.setup(set_prefix=False)
+    phases['setup'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    from django.core.wsgi import get_wsgi_application
+    get_wsgi_application()
+    phases['wsgi_application'] = time.perf_counter() - start
+
+    from core.warmup import warm_up
+    return {
+        'phases': {
+            name: round(seconds * 1000, 2) for name, seconds in phases.items()
+        },
+        'apps': {
+            label: {name: round(ms, 2) for name, ms in timings.items()}
+            for label, timings in apps.items()
+        },
+        'warmup': warm_up(),
+    }
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    json.dump(measure(), sys.stdout)
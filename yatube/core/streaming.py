@@ -0,0 +1,84 @@
+from django.http import StreamingHttpResponse
+from django.template import Context, loader
+from django.utils.crypto import get_random_string
+
+# Переменная контекста со списком отложенных частей страницы
+DEFERRED = 'streaming_deferred'
+
+
+class Deferred(list):
+    """Отложенные части отрисовки: [(метка, генератор кусков)]."""
+
+    def __init__(self):
+        super().__init__()
+        self.token = get_random_string(12)
+
+
+def snapshot(context):
+    """Копия контекста для отрисовки после того, как шаблон уже вернул
+    строку и его собственный контекст закрыт."""
+    copy = Context(context.flatten(), autoescape=context.autoescape)
+    copy.template = context.template
+    copy.template_name = context.template_name
+    copy[DEFERRED] = Deferred()
+    return copy
+
+
+def defer(context, produce):
+    """Откладывает часть страницы до потоковой отдачи: produce(контекст)
+    отдаёт её куски. Возвращает метку для вывода вместо этой части
+    или None, если страница рисуется целиком."""
+    deferred = context.get(DEFERRED)
+    if deferred is None:
+        return None
+    marker = f'<!--deferred:{deferred.token}:{len(deferred)}-->'
+    copy = snapshot(context)
+    deferred.append((marker, lambda: produce(copy)))
+    return marker
+
+
+def expand(html, deferred):
+    """Куски html, где метки заменены отложенными частями."""
+    position = 0
+    for marker, produce in deferred:
+        index = html.find(marker, position)
+        if index == -1:
+            # Вывод узла отброшен, например внутри ложного {% if %}
+            continue
+        yield html[position:index]
+        yield from produce()
+        position = index + len(marker)
+    yield html[position:]
+
+
+def render_chunks(nodelist, context):
+    """Отрисовывает nodelist в копии контекста, раскрывая вложенные
+    отложенные части по мере готовности."""
+    html = nodelist.render(context)
+    yield from expand(html, context[DEFERRED])
+
+
+def render_streaming(request, template_name, context=None):
+    """Как shortcuts.render, но ответ потоковый: сначала отдаётся
+    каркас страницы (head со ссылками на CSS, шапка), а части, которые
+    шаблонные теги отложили через defer(), — ленты карточек и фрагменты
+    кэша, — дорисовываются и отдаются по мере готовности.
+
+    SQL-запросы отложенных частей выполняются уже после middleware,
+    поэтому не попадают в их статистику и ограничения времени."""
+    deferred = Deferred()
+    context = dict(context or {}, **{DEFERRED: deferred})
+    template = loader.get_template(template_name)
+    # Сессия читается до ответа, чтобы SessionMiddleware добавил
+    # Vary: Cookie — шапка у вошедших другая
+    request.user.is_authenticated
+
+    def chunks():
+        html = template.render(context, request)
+        for chunk in expand(html, deferred):
+            if chunk:
+                yield chunk
+
+    return StreamingHttpResponse(
+        chunks(), content_type='text/html; charset=utf-8'
+    )
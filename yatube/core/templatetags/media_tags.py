@@ -0,0 +1,13 @@
+from django import template
+
+from core import media, tracing
+
+register = template.Library()
+
+
+@register.filter
+@tracing.traced('thumbnail.url')
+def resize_url(image, geometry):
+    if not image:
+        return ''
+    return media.resize_url(image.name, geometry)
@@ -1,5 +1,41 @@
-from django.test import Client, TestCase
+import gzip
+import io
+import json
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import zlib
+
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import OperationalError, connection
+from django.core.management import call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
 from http import HTTPStatus
+from PIL import Image
+
+from core import (
+    cache_tags, compression, degraded, loadtest, media, memory, metrics,
+    profiling, tracing, warmup,
+)
+from core.cache import TieredCache
+from core.stampede import get_or_recompute
+from core.management.commands.startup_report import parse_importtime
+from core.querystats import fingerprint, stats
+from posts.models import Post
+from yatube.settings import templates_version
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
 class CoreTest(TestCase):
@@ -11,3 +47,679 @@ class CoreTest(TestCase):
         response = self.guest_client.get('/not-found-page/')
         self.assertTemplateUsed(response, 'core/404.html')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ResizeTest(TestCase):
+    """Проверка эндпоинта /media/resize/"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.path = 'posts/red.png'
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'), exist_ok=True)
+        Image.new('RGB', (40, 20), 'red').save(
+            os.path.join(TEMP_MEDIA_ROOT, cls.path)
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_resize_creates_and_caches_variant(self):
+        """Вариант создаётся при первом запросе и берётся из кэша."""
+        url = media.resize_url(self.path, '10x10')
+        response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        variant = media.cache_path('10x10', self.path)
+        with Image.open(variant) as image:
+            self.assertEqual(image.size, (10, 10))
+        mtime = os.path.getmtime(variant)
+        self.guest_client.get(url)
+        self.assertEqual(os.path.getmtime(variant), mtime)
+
+    def test_resize_rejects_bad_requests(self):
+        """Неверная подпись, размер или путь дают 404."""
+        signature = media.sign('10x10', self.path)
+        urls = (
+            f'/media/resize/{signature}/20x20/{self.path}',
+            media.resize_url(self.path, '0x10'),
+            media.resize_url('posts/missing.png', '10x10'),
+            media.resize_url('../settings.py', '10x10'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    @override_settings(RESIZE_SENDFILE_HEADER='X-Accel-Redirect')
+    def test_resize_sendfile_header(self):
+        """С RESIZE_SENDFILE_HEADER файл отдаёт фронтенд-сервер."""
+        response = self.guest_client.get(
+            media.resize_url(self.path, '10x10')
+        )
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            settings.RESIZE_SENDFILE_PREFIX + f'10x10/{self.path}'
+        )
+        self.assertEqual(response.content, b'')
+
+
+class QueryStatsTest(TestCase):
+    """Проверка учёта SQL-запросов по страницам"""
+
+    def setUp(self):
+        self.guest_client = Client()
+        stats.reset()
+
+    def test_fingerprint_hides_literals(self):
+        """Отпечаток не зависит от литералов и длины списка IN."""
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE a = 'x' AND b IN (1, 2, 3)"),
+            fingerprint("SELECT  *  FROM t WHERE a = 'y' AND b IN (%s)"),
+        )
+
+    def test_middleware_records_queries(self):
+        """Запросы страницы попадают в статистику и Server-Timing."""
+        response = self.guest_client.get('/')
+        self.assertRegex(
+            response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries"'
+        )
+        views = {view['view_name']: view for view in stats.by_view()}
+        self.assertEqual(views['posts:index']['requests'], 1)
+        self.assertTrue(any(
+            'posts:index' in query['views'] for query in stats.top()
+        ))
+
+    def test_panel_is_staff_only(self):
+        """Панель статистики доступна только сотрудникам."""
+        response = self.guest_client.get('/admin/queries/')
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.guest_client.force_login(staff)
+        response = self.guest_client.get('/admin/queries/')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTemplateUsed(response, 'core/query_stats.html')
+
+
+class LoadTestReportTest(TestCase):
+    """Проверка отчёта нагрузочного прогона"""
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(loadtest.percentile(values, 50), 50)
+        self.assertEqual(loadtest.percentile(values, 99), 99)
+        self.assertEqual(loadtest.percentile([7], 95), 7)
+
+    def test_compare_with_baseline(self):
+        """Ухудшение RPS и p95 сверх допуска попадает в список."""
+        baseline = {'rps': 100, 'routes': {'posts:index': {'p95_ms': 10}}}
+        report = {'rps': 95, 'routes': {'posts:index': {'p95_ms': 11}}}
+        self.assertEqual(loadtest.compare(report, baseline, 0.2), [])
+        report = {'rps': 50, 'routes': {'posts:index': {'p95_ms': 30}}}
+        self.assertEqual(len(loadtest.compare(report, baseline, 0.2)), 2)
+
+
+class MetricsTest(TestCase):
+    """Проверка /metrics"""
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_metrics_exposes_requests_and_cache(self):
+        """После запроса ленты видны её время ответа и кэш фрагмента."""
+        self.guest_client.get('/')
+        with override_settings(METRICS_TOKEN='секрет'):
+            response = self.guest_client.get(
+                '/metrics', HTTP_AUTHORIZATION='Bearer секрет'
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        text = response.content.decode()
+        self.assertIn(
+            'yatube_http_request_duration_seconds_count{route="posts:index",'
+            'method="GET",status="200"}',
+            text
+        )
+        self.assertIn('yatube_db_queries_total{route="posts:index"}', text)
+        self.assertIn('fragment="index_page"', text)
+
+    def test_metrics_need_token_or_staff(self):
+        """С локального адреса без токена метрики не отдаются: за прокси
+        так приходят все запросы."""
+        staff_client = Client()
+        staff_client.force_login(
+            User.objects.create_user(username='staff', is_staff=True)
+        )
+        with override_settings(METRICS_TOKEN='секрет'):
+            for headers in (
+                {}, {'HTTP_AUTHORIZATION': 'Bearer другой'},
+            ):
+                with self.subTest(headers=headers):
+                    response = self.guest_client.get(
+                        '/metrics', REMOTE_ADDR='127.0.0.1', **headers
+                    )
+                    self.assertEqual(
+                        response.status_code, HTTPStatus.NOT_FOUND
+                    )
+        with override_settings(METRICS_TOKEN=None):
+            response = self.guest_client.get(
+                '/metrics', HTTP_AUTHORIZATION='Bearer '
+            )
+            self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+            response = staff_client.get('/metrics')
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_multiprocess_values_are_summed(self):
+        """Значения из файлов других процессов складываются."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        name = metrics.upload_size.name
+        with open(os.path.join(directory, '1.json'), 'w') as dump_file:
+            json.dump({name: {'["other"]': [1] * 10}}, dump_file)
+        with override_settings(METRICS_MULTIPROC_DIR=directory):
+            metrics.upload_size.observe(100, 'other')
+            text = metrics.registry.render()
+        own = metrics.upload_size.values[('other',)][-1]
+        self.assertIn(
+            f'yatube_upload_size_bytes_count{{kind="other"}} {own + 1}', text
+        )
+
+
+class ProfilingTest(TestCase):
+    """Проверка профилирования запросов"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(PROFILER_DIR=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.staff_client = Client()
+        self.staff_client.force_login(
+            User.objects.create_user(username='staff', is_staff=True)
+        )
+
+    def test_staff_header_profiles_request(self):
+        """По заголовку X-Profile профиль сохраняется и виден в панели."""
+        for mode in ('1', 'cprofile'):
+            with self.subTest(mode=mode):
+                response = self.staff_client.get('/', HTTP_X_PROFILE=mode)
+                profile_id = response['X-Profile-Id']
+                meta = profiling.load(profile_id)
+                self.assertEqual(meta['route'], 'posts:index')
+                response = self.staff_client.get(
+                    f'/admin/profiles/{profile_id}/'
+                )
+                self.assertTemplateUsed(response, 'core/profile_detail.html')
+                response = self.staff_client.get(
+                    f'/admin/profiles/{profile_id}/?format=folded'
+                )
+                self.assertEqual(response['Content-Type'], 'text/plain')
+        response = self.staff_client.get('/admin/profiles/')
+        self.assertEqual(len(response.context['profiles']), 2)
+
+    def test_header_ignored_for_guests(self):
+        response = Client().get('/', HTTP_X_PROFILE='1')
+        self.assertFalse(response.has_header('X-Profile-Id'))
+
+    @override_settings(PROFILER_SAMPLE_RATE=1, PROFILER_THRESHOLD_MS=0)
+    def test_sampled_requests_respect_routes(self):
+        """Случайные профили пишутся только для PROFILER_ROUTES."""
+        self.assertFalse(Client().get('/').has_header('X-Profile-Id'))
+        response = Client().get('/profile/staff/')
+        self.assertTrue(response.has_header('X-Profile-Id'))
+
+
+class TracingTest(TestCase):
+    """Проверка трассировки запросов"""
+
+    def test_sampled_request_exports_zipkin_spans(self):
+        """Трасса содержит view, SQL и шаблоны с общим корнем."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        trace_file = os.path.join(directory, 'traces.jsonl')
+        with override_settings(TRACING_SAMPLE_RATE=1, TRACING_FILE=trace_file):
+            response = Client().get('/')
+        with open(trace_file) as lines:
+            spans = json.loads(lines.readline())
+        root = spans[-1]
+        self.assertEqual(root['traceId'], response['X-Trace-Id'])
+        self.assertEqual(root['name'], 'posts:index')
+        self.assertEqual(root['kind'], 'SERVER')
+        names = {span['name'] for span in spans}
+        self.assertIn('view posts:index', names)
+        self.assertIn('sql', names)
+        self.assertIn('template posts/index.html', names)
+        self.assertIn('template includes/header.html', names)
+        ids = {span['id'] for span in spans}
+        self.assertTrue(all(
+            span['parentId'] in ids for span in spans[:-1]
+        ))
+
+    def test_span_outside_trace_is_noop(self):
+        with tracing.span('idle') as idle:
+            self.assertIsNone(idle)
+
+
+class MemoryTest(TestCase):
+    """Проверка диагностики памяти"""
+
+    def setUp(self):
+        self.addCleanup(memory.stop)
+
+    def test_panel_snapshots_and_cache_sizes(self):
+        """Панель включает tracemalloc, делает снимки и видит кэш."""
+        staff_client = Client()
+        staff_client.force_login(
+            User.objects.create_user(username='staff', is_staff=True)
+        )
+        self.assertEqual(
+            Client().get('/admin/memory/').status_code, HTTPStatus.FOUND
+        )
+        staff_client.get('/')
+        for _ in range(2):
+            staff_client.post('/admin/memory/', {'action': 'snapshot'})
+        report = staff_client.get('/admin/memory/').context['report']
+        self.assertTrue(report['tracing'])
+        self.assertTrue(report['top'])
+        self.assertIn('diff_since', report)
+        sizes = {cache['name']: cache for cache in report['caches']}
+        self.assertGreater(sizes['cache:default:l1']['entries'], 0)
+
+    def test_memory_report_command_signals_process(self):
+        """Команда сигналом просит процесс записать отчёт."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(
+            signal.signal, signal.SIGUSR2, signal.getsignal(signal.SIGUSR2)
+        )
+        output = io.StringIO()
+        with override_settings(
+            MEMORY_REPORT_DIR=directory, MEMORY_SIGNAL='SIGUSR2'
+        ):
+            memory.install_signal_handler()
+            call_command('memory_report', str(os.getpid()), stdout=output)
+            call_command('memory_report', str(os.getpid()), stdout=output)
+        self.assertIn(f'PID {os.getpid()}', output.getvalue())
+        self.assertIn('Топ', output.getvalue())
+
+    def test_signal_handler_defers_work(self):
+        """Обработчик сигнала не берёт lock: отчёт пишет отдельный поток."""
+        requested = threading.Event()
+        with mock.patch.object(memory, 'report_requested', requested), \
+                mock.patch.object(memory, 'write_report') as write_report:
+            with memory.lock:
+                memory.handle_signal(signal.SIGUSR2, None)
+        write_report.assert_not_called()
+        self.assertTrue(requested.is_set())
+
+
+class StartupTest(TestCase):
+    """Проверка прогрева и отчёта о запуске"""
+
+    def test_warm_up_runs_all_steps(self):
+        timings = warmup.warm_up()
+        self.assertEqual(
+            list(timings), [name for name, step in warmup.STEPS]
+        )
+
+    def test_parse_importtime(self):
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |   posts.models\n'
+            'import time:       300 |        420 | posts\n'
+        )
+        self.assertEqual(parse_importtime(output), [
+            ('posts.models', 120, 120, 1),
+            ('posts', 300, 420, 0),
+        ])
+
+
+class TieredCacheTest(TestCase):
+    """Проверка двухуровневого кэша: два экземпляра с общим файлом
+    ведут себя как два воркера."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'l2.sqlite3')
+        self.first = self.worker()
+        self.second = self.worker()
+
+    def worker(self, **options):
+        # Журнал читается перед каждым чтением L1, чтобы изменения
+        # другого воркера были видны сразу
+        options.setdefault('POLL_INTERVAL', 0)
+        return TieredCache(self.path, {'OPTIONS': options})
+
+    def test_value_is_shared_and_invalidated(self):
+        """Запись одного воркера видна другому, а старое значение
+        из его L1 не отдаётся."""
+        self.first.set('fragment', 'старый')
+        self.assertEqual(self.second.get('fragment'), 'старый')
+        self.second.set('fragment', 'новый')
+        self.assertEqual(self.first.get('fragment'), 'новый')
+        self.first.delete('fragment')
+        self.assertIsNone(self.second.get('fragment'))
+        self.second.set('fragment', 'ещё')
+        self.first.get('fragment')
+        self.second.clear()
+        self.assertIsNone(self.first.get('fragment'))
+
+    def test_l1_hits_skip_sqlite_within_poll_interval(self):
+        """Между чтениями журнала попадание в L1 не ходит в SQLite,
+        а чужое изменение становится видно после POLL_INTERVAL."""
+        cache = self.worker(POLL_INTERVAL=60)
+        cache.set('fragment', 'старый')
+        cache.get('fragment')
+        self.second.set('fragment', 'новый')
+        statements = []
+        cache._db().set_trace_callback(statements.append)
+        self.assertEqual(cache.get('fragment'), 'старый')
+        self.assertEqual(statements, [])
+        cache._last_poll -= 60
+        self.assertEqual(cache.get('fragment'), 'новый')
+
+    def test_tests_use_own_l2(self):
+        """Тесты не делят L2 с сервером разработки."""
+        self.assertTrue(
+            cache.path.startswith(settings.TEST_CACHE_DIR), cache.path
+        )
+
+    def test_keys_carry_templates_version(self):
+        """Правка шаблона меняет префикс ключей, и старый HTML из L2
+        после выкладки не читается."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, 'page.html'), 'w') as template:
+            template.write('<p>старый</p>')
+        before = templates_version(directory)
+        self.assertEqual(templates_version(directory), before)
+        with open(os.path.join(directory, 'page.html'), 'w') as template:
+            template.write('<p>новый</p>')
+        self.assertNotEqual(templates_version(directory), before)
+        self.assertEqual(cache.key_prefix, (
+            os.environ.get('DEPLOY_VERSION')
+            or templates_version(settings.TEMPLATES_DIR)
+        ))
+        self.assertTrue(cache.make_key('page').startswith(cache.key_prefix))
+
+    def test_add_is_atomic_across_workers(self):
+        self.assertTrue(self.first.add('lock', 1, 10))
+        self.assertFalse(self.second.add('lock', 2, 10))
+        self.assertEqual(self.second.get('lock'), 1)
+        self.first.set('expired', 1, 0)
+        self.assertTrue(self.second.add('expired', 2, 10))
+
+    def test_tiers_are_size_bounded(self):
+        """L1 держит не больше L1_MAX_ENTRIES, L2 — около L2_MAX_BYTES."""
+        cache = self.worker(
+            L1_MAX_ENTRIES=3, L2_MAX_BYTES=10_000, CULL_EVERY=1
+        )
+        for number in range(20):
+            cache.set(f'page{number}', 'x' * 1000)
+        self.assertEqual(len(cache._l1), 3)
+        size = cache._db().execute('SELECT SUM(size) FROM cache').fetchone()
+        self.assertLessEqual(size[0], 10_000)
+        self.assertIsNotNone(cache.get('page19'))
+        self.assertIsNone(cache.get('page0'))
+
+    def test_large_values_are_compressed(self):
+        """Значения от COMPRESS_MIN_BYTES хранятся сжатыми и читаются
+        любым воркером, мелкие остаются как есть."""
+        cache = self.worker(COMPRESS_MIN_BYTES=1024)
+        page = '<article>Текст поста</article>' * 200
+        cache.set('page', page)
+        cache.set('small', 'коротко')
+        sizes = dict(cache._db().execute('SELECT key, size FROM cache'))
+        self.assertLess(sizes[cache.make_key('page')], len(page) / 5)
+        self.assertEqual(self.second.get('page'), page)
+        self.assertEqual(cache.get('page'), page)
+        self.assertEqual(self.second.get('small'), 'коротко')
+        stats = cache.compression_stats()
+        self.assertEqual(stats['values'], 1)
+        self.assertGreater(stats['ratio'], 5)
+
+
+@override_settings(CACHE_LOCK_WAIT=5)
+class StampedeTest(TestCase):
+    """Проверка защиты от лавины пересчётов"""
+
+    def setUp(self):
+        self.cache = LocMemCache('stampede', {})
+        self.calls = 0
+
+    def slow_compute(self):
+        self.calls += 1
+        time.sleep(0.2)
+        return f'значение {self.calls}'
+
+    def run_concurrently(self, count=5, tags=()):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_recompute(
+                'feed', self.slow_compute, 60, cache=self.cache, tags=tags
+            )))
+            for _ in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_cold_cache_is_computed_once(self):
+        """Одновременные запросы к пустому кэшу ждут одного пересчёта."""
+        results = self.run_concurrently()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(set(results), {'значение 1'})
+
+    def test_tags_invalidate_entry(self):
+        """invalidate() тега делает запись устаревшей, чужие теги
+        её не трогают."""
+        def compute():
+            self.calls += 1
+            return self.calls
+
+        def read():
+            return get_or_recompute(
+                'feed', compute, 3600, self.cache, tags=['post:1', 'feed']
+            )
+
+        self.assertEqual(read(), 1)
+        cache_tags.invalidate('post:2', cache=self.cache)
+        self.assertEqual(read(), 1)
+        cache_tags.invalidate('post:1', cache=self.cache)
+        self.assertEqual(read(), 2)
+
+    def test_waiters_get_previous_value(self):
+        """Пока один пересчитывает устаревшее значение, остальные
+        получают прежнее."""
+        self.cache.set('feed', ('старое', 0.2, time.time() - 1, ''), 300)
+        results = self.run_concurrently()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results.count('старое'), 4)
+        self.assertIn('значение 1', results)
+        self.assertEqual(
+            get_or_recompute('feed', self.slow_compute, 60, self.cache),
+            'значение 1'
+        )
+
+    def test_waiters_get_value_from_before_invalidation(self):
+        """После invalidate() тега ожидающие не ждут пересчёта, а получают
+        значение, посчитанное до сброса."""
+        get_or_recompute(
+            'feed', lambda: 'старое', 60, self.cache, tags=['feed:index']
+        )
+        cache_tags.invalidate('feed:index', cache=self.cache)
+        start = time.monotonic()
+        results = self.run_concurrently(tags=['feed:index'])
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results.count('старое'), 4)
+        self.assertIn('значение 1', results)
+
+
+class DegradedModeTest(TestCase):
+    """Проверка отдачи запасной копии при проблемах с базой"""
+
+    def setUp(self):
+        cache.clear()
+        degraded.saved_at.clear()
+        degraded.degraded_until.clear()
+        self.guest_client = Client()
+        submit = mock.patch.object(degraded.executor, 'submit')
+        self.submit = submit.start()
+        self.addCleanup(submit.stop)
+        self.addCleanup(degraded.degraded_until.clear)
+
+    def test_stale_copy_served_when_database_fails(self):
+        """Упавшая база — прежняя копия с Warning, затем пауза без базы
+        и перерисовка в фоне."""
+        fresh = self.guest_client.get('/')
+        failing = mock.patch(
+            'posts.views.Post.objects.all',
+            side_effect=OperationalError('database is locked'),
+        )
+        with failing as all_posts:
+            stale = self.guest_client.get('/')
+            again = self.guest_client.get('/')
+        self.assertEqual(stale.status_code, HTTPStatus.OK)
+        self.assertEqual(stale.content, fresh.content)
+        self.assertIn('Response is Stale', stale['Warning'])
+        self.assertEqual(again.content, fresh.content)
+        self.assertEqual(all_posts.call_count, 1)
+        self.submit.assert_called_once()
+        background = self.submit.call_args[0][2]
+        self.assertIsNot(background, stale.wsgi_request)
+        self.assertEqual(background.get_full_path(), '/')
+        self.assertEqual(background.resolver_match.url_name, 'index')
+        self.assertFalse(background.user.is_authenticated)
+
+    def test_copy_key_ignores_extra_parameters(self):
+        """Посторонние параметры запроса не создают новых копий."""
+        for path in ('/', '/?page=1', '/?page=abc&x=1', '/?utm=2'):
+            self.guest_client.get(path)
+        self.guest_client.get('/?page=2')
+        self.assertEqual(
+            set(degraded.saved_at),
+            {'stale:posts:index::1', 'stale:posts:index::2'}
+        )
+
+    def test_only_guest_pages_are_stored(self):
+        """Страница вошедшего пользователя с CSRF-токеном не попадает
+        в копию, а при сбое он получает гостевую."""
+        user = User.objects.create_user(username='degraded')
+        post = Post.objects.create(author=user, text='Пост')
+        path = f'/posts/{post.pk}/'
+        logged_in = Client()
+        logged_in.force_login(user)
+        self.assertContains(logged_in.get(path), 'csrfmiddlewaretoken')
+        self.assertEqual(dict(degraded.saved_at), {})
+        fresh = self.guest_client.get(path)
+        with mock.patch(
+            'posts.views.get_object_or_404',
+            side_effect=OperationalError('database is locked'),
+        ):
+            stale = logged_in.get(path)
+        self.assertEqual(stale.content, fresh.content)
+        self.assertNotContains(stale, 'csrfmiddlewaretoken')
+
+    def test_deadline_only_with_copy(self):
+        """Без копии запрос ждёт базу как обычно, без срока."""
+        with mock.patch.object(
+            degraded, 'db_deadline', wraps=degraded.db_deadline
+        ) as deadline:
+            self.guest_client.get('/')
+            deadline.assert_not_called()
+            self.guest_client.get('/')
+            deadline.assert_called_once_with(settings.DEGRADED_DB_DEADLINE)
+
+    def test_error_without_copy_is_raised(self):
+        with mock.patch(
+            'posts.views.Post.objects.all',
+            side_effect=OperationalError('database is locked'),
+        ):
+            with self.assertRaises(OperationalError):
+                self.guest_client.get('/')
+
+    def test_deadline_interrupts_query(self):
+        slow_sql = (
+            'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL '
+            'SELECT i + 1 FROM n WHERE i < 100000000) SELECT COUNT(*) FROM n'
+        )
+        with self.assertRaises(OperationalError):
+            with degraded.db_deadline(0.05):
+                with connection.cursor() as cursor:
+                    cursor.execute(slow_sql)
+
+
+@override_settings(GZIP_MIN_BYTES=1024, GZIP_LEVEL=6)
+class CompressionTest(TestCase):
+    """Проверка сжатия ответов gzip"""
+
+    page = '<article>Текст поста</article>\n' * 100
+
+    def respond(self, response, **headers):
+        request = RequestFactory().get('/', **headers)
+        return compression.GZipMiddleware(lambda request: response)(request)
+
+    def gzip(self, response):
+        return self.respond(response, HTTP_ACCEPT_ENCODING='gzip, br')
+
+    def test_html_is_compressed(self):
+        response = self.gzip(HttpResponse(self.page))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(
+            int(response['Content-Length']), len(response.content)
+        )
+        self.assertEqual(gzip.decompress(response.content).decode(), self.page)
+
+    def test_skipped_responses(self):
+        """Без gzip в Accept-Encoding, короткие ответы и картинки
+        отдаются как есть."""
+        plain = self.respond(HttpResponse(self.page))
+        short = self.gzip(HttpResponse('коротко'))
+        image = self.gzip(HttpResponse(
+            b'\xff\xd8' * 1000, content_type='image/jpeg'
+        ))
+        for response in plain, short, image:
+            with self.subTest(content_type=response['Content-Type']):
+                self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        self.assertEqual(plain.content.decode(), self.page)
+
+    def test_stream_is_flushed_by_chunks(self):
+        """Каждый кусок потока можно распаковать сразу, не дожидаясь
+        остальных."""
+        chunks = ['<head>' + 'x' * 2000 + '</head>', self.page, '']
+        response = self.gzip(StreamingHttpResponse(iter(chunks)))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        unpacker = zlib.decompressobj(compression.GZIP_WBITS)
+        received = [
+            unpacker.decompress(chunk).decode()
+            for chunk in response.streaming_content
+        ]
+        self.assertEqual(received[:2], chunks[:2])
+        self.assertTrue(unpacker.eof)
+
+    def test_short_stream_is_not_compressed(self):
+        response = self.gzip(StreamingHttpResponse(iter(['a', 'b'])))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(response.streaming_content), b'ab')
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command(
+            'benchmark_gzip', pages=1, profiles=0, levels=[1, 9], repeat=1,
+            stdout=out,
+        )
+        self.assertIn('Страниц: 1', out.getvalue())
+        self.assertIn('уровень 9', out.getvalue())
@@ -0,0 +1,192 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.template import base as template_base
+
+from .querystats import route_name
+
+logger = logging.getLogger(__name__)
+
+current_span = contextvars.ContextVar('current_span', default=None)
+
+exporter = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tracing')
+file_lock = threading.Lock()
+
+MAX_TAG_LENGTH = 500
+
+
+def new_id(bits=64):
+    return f'{random.getrandbits(bits):0{bits // 4}x}'
+
+
+class Span:
+    """Отрезок работы внутри трассы; spans — общий список трассы,
+    куда попадает span при завершении."""
+
+    __slots__ = (
+        'trace_id', 'id', 'parent_id', 'name', 'kind', 'tags',
+        'timestamp', 'start', 'duration', 'spans',
+    )
+
+    def __init__(self, name, parent=None, kind=None, tags=None):
+        self.trace_id = parent.trace_id if parent else new_id(128)
+        self.id = new_id()
+        self.parent_id = parent.id if parent else None
+        self.spans = parent.spans if parent else []
+        self.name = name
+        self.kind = kind
+        self.tags = tags or {}
+        self.timestamp = int(time.time() * 1e6)
+        self.start = time.perf_counter()
+        self.duration = None
+
+    def finish(self):
+        self.duration = max(1, int((time.perf_counter() - self.start) * 1e6))
+        self.spans.append(self)
+
+    def as_zipkin(self):
+        span = {
+            'traceId': self.trace_id,
+            'id': self.id,
+            'name': self.name,
+            'timestamp': self.timestamp,
+            'duration': self.duration,
+            'localEndpoint': {'serviceName': settings.TRACING_SERVICE_NAME},
+            'tags': {
+                key: str(value)[:MAX_TAG_LENGTH]
+                for key, value in self.tags.items()
+            },
+        }
+        if self.parent_id:
+            span['parentId'] = self.parent_id
+        if self.kind:
+            span['kind'] = self.kind
+        return span
+
+
+@contextmanager
+def span(name, **tags):
+    """Вложенный span текущей трассы; вне трассы ничего не делает."""
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, parent, tags=tags)
+    token = current_span.set(child)
+    try:
+        yield child
+    finally:
+        current_span.reset(token)
+        child.finish()
+
+
+def traced(name):
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if current_span.get() is None:
+                return function(*args, **kwargs)
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def sql_span(execute, sql, params, many, context):
+    with span('sql', **{'db.statement': sql}):
+        return execute(sql, params, many, context)
+
+
+def install_template_spans():
+    """Оборачивает Template.render: span на каждый шаблон и include."""
+    original = template_base.Template.render
+    if getattr(original, 'traced', False):
+        return
+
+    @wraps(original)
+    def render(self, context):
+        if current_span.get() is None:
+            return original(self, context)
+        with span(f'template {self.name or "<string>"}'):
+            return original(self, context)
+
+    render.traced = True
+    template_base.Template.render = render
+
+
+def export(spans):
+    """Пишет трассу в формате Zipkin v2: строкой JSON в TRACING_FILE
+    и/или POST-запросом в коллектор TRACING_COLLECTOR_URL в фоне."""
+    payload = [item.as_zipkin() for item in spans]
+    if settings.TRACING_FILE:
+        os.makedirs(os.path.dirname(settings.TRACING_FILE), exist_ok=True)
+        with file_lock, open(settings.TRACING_FILE, 'a') as trace_file:
+            trace_file.write(json.dumps(payload, ensure_ascii=False) + '\n')
+    if settings.TRACING_COLLECTOR_URL:
+        exporter.submit(send, settings.TRACING_COLLECTOR_URL, payload)
+
+
+def send(url, payload):
+    # requests грузится долго, а нужен только при отправке в коллектор
+    import requests
+    try:
+        requests.post(url, json=payload, timeout=5)
+    except requests.RequestException:
+        logger.warning('Не удалось отправить трассу в %s', url)
+
+
+class TracingMiddleware:
+    """Корневой span запроса для доли TRACING_SAMPLE_RATE запросов
+    и span на каждый SQL-запрос внутри него."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.TRACING_SAMPLE_RATE
+        if not rate or random.random() >= rate:
+            return self.get_response(request)
+        root = Span(request.path, kind='SERVER', tags={
+            'http.method': request.method,
+            'http.path': request.path,
+        })
+        token = current_span.set(root)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(sql_span))
+                response = self.get_response(request)
+        finally:
+            current_span.reset(token)
+        root.name = route_name(request)
+        root.tags['http.status_code'] = response.status_code
+        root.finish()
+        response['X-Trace-Id'] = root.trace_id
+        export(root.spans)
+        return response
+
+
+class ViewSpanMiddleware:
+    """Span вокруг разбора URL, view и рендеринга ответа. Должна стоять
+    последней, чтобы не включать время остальных middleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if current_span.get() is None:
+            return self.get_response(request)
+        with span('view') as view_span:
+            response = self.get_response(request)
+            view_span.name = f'view {route_name(request)}'
+            return response
@@ -1,6 +1,18 @@
+import os
 from http import HTTPStatus
 
-from django.shortcuts import render
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import redirect, render
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_safe
+
+from . import media, memory, metrics, profiling
+from .querystats import stats
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
 
 
 def page_not_found(request, exception):
@@ -29,3 +41,113 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@require_safe
+def resize(request, signature, geometry, path):
+    if not media.check_signature(signature, geometry, path):
+        raise Http404
+    try:
+        variant = media.get_variant(geometry, path)
+    except (ValueError, OSError, SuspiciousFileOperation):
+        raise Http404
+    header = settings.RESIZE_SENDFILE_HEADER
+    if header:
+        response = HttpResponse(content_type='image/jpeg')
+        if header == 'X-Accel-Redirect':
+            relative = os.path.relpath(variant, media.cache_root())
+            response[header] = settings.RESIZE_SENDFILE_PREFIX + relative
+        else:
+            response[header] = variant
+    else:
+        response = FileResponse(open(variant, 'rb'), content_type='image/jpeg')
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response['ETag'] = f'"{signature}"'
+    return response
+
+
+@staff_member_required
+def query_stats(request):
+    if request.method == 'POST':
+        stats.reset()
+        return redirect('query_stats')
+    order_by = request.GET.get('order', 'total_ms')
+    if order_by not in ('total_ms', 'calls', 'mean_ms', 'max_ms'):
+        order_by = 'total_ms'
+    context = {
+        'views': stats.by_view(),
+        'queries': stats.top(order_by=order_by),
+        'order_by': order_by,
+    }
+    return render(request, 'core/query_stats.html', context)
+
+
+def metrics_allowed(request):
+    """Сборщик предъявляет Authorization: Bearer <METRICS_TOKEN>, людям
+    достаточно войти сотрудником. Адрес клиента не проверяется: за
+    прокси на той же машине все запросы приходят с 127.0.0.1."""
+    if request.user.is_active and request.user.is_staff:
+        return True
+    token = settings.METRICS_TOKEN
+    scheme, _, credentials = request.META.get(
+        'HTTP_AUTHORIZATION', ''
+    ).partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and (
+        constant_time_compare(credentials.strip(), token)
+    )
+
+
+@require_safe
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus."""
+    if not metrics_allowed(request):
+        raise Http404
+    return HttpResponse(
+        metrics.registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@staff_member_required
+def profiles(request):
+    return render(
+        request, 'core/profiles.html',
+        {'profiles': profiling.list_profiles()},
+    )
+
+
+@staff_member_required
+def profile_detail(request, profile_id):
+    meta = profiling.load(profile_id)
+    if meta is None:
+        raise Http404
+    folded = profiling.read_folded(profile_id)
+    if request.GET.get('format') == 'folded':
+        response = HttpResponse(folded, content_type='text/plain')
+        response['Content-Disposition'] = (
+            f'attachment; filename="{profile_id}.folded"'
+        )
+        return response
+    stacks = []
+    for line in folded.splitlines()[:settings.PROFILER_TOP_STACKS]:
+        stack, count = line.rsplit(' ', 1)
+        stacks.append({'frames': stack.split(';'), 'count': int(count)})
+    return render(
+        request, 'core/profile_detail.html',
+        {'profile': meta, 'stacks': stacks},
+    )
+
+
+@staff_member_required
+def memory_view(request):
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action == 'start':
+            memory.start()
+        elif action == 'snapshot':
+            memory.start()
+            memory.take_snapshot()
+        elif action == 'stop':
+            memory.stop()
+        return redirect('memory')
+    return render(request, 'core/memory.html', {'report': memory.report()})
@@ -0,0 +1,83 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.urls import get_resolver
+
+
+def imports():
+    """Модули, которые иначе грузятся при первой картинке."""
+    from PIL import Image, ImageOps  # noqa: F401
+    import sorl.thumbnail  # noqa: F401
+    Image.init()
+
+
+def urls():
+    """Строит обратные словари резолвера всех пространств имён."""
+    resolver = get_resolver()
+    resolver.resolve('/')
+    pending = [resolver]
+    while pending:
+        current = pending.pop()
+        # Обращение к свойству заполняет ленивые словари резолвера
+        current.reverse_dict
+        pending.extend(
+            sub_resolver for prefix, sub_resolver
+            in current.namespace_dict.values()
+        )
+
+
+def template_names(directory):
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            if name.endswith('.html'):
+                yield os.path.relpath(os.path.join(root, name), directory)
+
+
+def templates():
+    """Компилирует все шаблоны проекта и приложений. Скомпилированное
+    сохраняется только при кэширующем загрузчике (DEBUG = False), но
+    библиотеки тегов грузятся в любом случае."""
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            for name in template_names(directory):
+                try:
+                    engine.get_template(name)
+                except (TemplateDoesNotExist, TemplateSyntaxError):
+                    pass
+
+
+def database():
+    """Открывает соединения; в запросах они переиспользуются только
+    при CONN_MAX_AGE > 0 и в том же потоке."""
+    for connection in connections.all():
+        connection.ensure_connection()
+    from posts import search
+    search.fts_available()
+
+
+def cache():
+    for alias in settings.CACHES:
+        caches[alias]
+
+
+STEPS = (
+    ('imports', imports),
+    ('urls', urls),
+    ('templates', templates),
+    ('cache', cache),
+    ('database', database),
+)
+
+
+def warm_up():
+    """Выполняет шаги прогрева и возвращает их время в миллисекундах."""
+    timings = {}
+    for name, step in STEPS:
+        start = time.perf_counter()
+        step()
+        timings[name] = round((time.perf_counter() - start) * 1000, 2)
+    return timings
@@ -1,15 +1,29 @@
+from django.conf import settings
 from django.contrib import admin
 
-from .models import Post, Group, Follow, Comment
+from . import search
+from .models import Post, PostImage, Group, Follow, Comment
+
+
+class PostImageInline(admin.TabularInline):
+    model = PostImage
+    max_num = settings.POST_IMAGES_LIMIT
+    extra = 1
 
 
 class PostAdmin(admin.ModelAdmin):
+    inlines = (PostImageInline,)
     list_editable = ('group',)
     list_display = ('pk', 'group', 'text', 'pub_date', 'author')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if search.normalize(search_term):
+            return search.filter_posts(queryset, search_term), False
+        return super().get_search_results(request, queryset, search_term)
+
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('user', 'author')
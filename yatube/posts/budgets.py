@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.db import transaction
+from django.test import Client
+
+from core.budgets import Budget, measure, violations, write_report
+from .queryplans import cases, seed
+
+# Размер набора данных, для которого заданы бюджеты
+DATASET = {'posts': 200}
+
+BUDGETS = {
+    'index': Budget(queries=5, time_ms=250, size=15_000),
+    'group_list': Budget(queries=6, time_ms=250, size=15_000),
+    'profile': Budget(queries=7, time_ms=250, size=15_000),
+    'post_detail': Budget(queries=5, time_ms=150, size=8_000),
+    'search': Budget(queries=6, time_ms=250, size=15_000),
+    'follow_index': Budget(queries=5, time_ms=250, size=15_000),
+    'post_create': Budget(queries=3, time_ms=150, size=8_000),
+    'post_edit': Budget(queries=5, time_ms=150, size=8_000),
+}
+
+
+def check_budgets(report_path=None, limits=None):
+    """Замеряет страницы с бюджетом на наборе DATASET, пишет отчёт
+    и возвращает список нарушений пределов limits (по умолчанию всех).
+    Время пишется в отчёт всегда, но проверять его стоит командой
+    check_budgets на спокойной машине, а не в тестах."""
+    results = {}
+    errors = []
+    with transaction.atomic():
+        data = seed(post_count=DATASET['posts'])
+        client = Client()
+        client.force_login(data.user)
+        requests = cases(data)
+        for name, budget in BUDGETS.items():
+            method, url, payload = requests[name]
+            measurement = measure(
+                lambda: getattr(client, method)(url, payload or {})
+            )
+            measurement['budget'] = budget.as_dict()
+            results[f'posts:{name}'] = measurement
+            errors.extend(
+                f'posts:{name}: {problem}'
+                for problem in violations(budget, measurement, limits)
+            )
+        transaction.set_rollback(True)
+    write_report(
+        report_path or settings.PERF_BUDGET_REPORT, DATASET, results
+    )
+    return errors
@@ -0,0 +1,154 @@
+from functools import lru_cache
+
+from django.core.paginator import Page, Paginator
+from django.db.models import QuerySet
+from django.urls import reverse
+
+from .models import Post, PostImage
+
+# Поля строки ленты: только то, что печатает includes/post.html
+CARD_FIELDS = (
+    'pk', 'text', 'pub_date', 'image', 'author__username',
+    'author__first_name', 'author__last_name', 'group__slug',
+)
+
+POST_IMAGE = Post._meta.get_field('image')
+GALLERY_IMAGE = PostImage._meta.get_field('image')
+
+
+class PostCard:
+    """Пост в ленте без экземпляров Post, User и Group: текст, дата,
+    имя автора, картинки и готовые адреса. Карточки равны друг другу
+    по pk; с моделями их сравнивают по pk явно."""
+
+    __slots__ = (
+        'pk', 'text', 'pub_date', 'image', 'gallery', 'author_name',
+        'url', 'author_url', 'group_url',
+    )
+
+    def __init__(self, pk, text, pub_date, image, gallery, author_name,
+                 author_url, group_url):
+        self.pk = pk
+        self.text = text
+        self.pub_date = pub_date
+        self.image = image
+        self.gallery = gallery
+        self.author_name = author_name
+        self.url = reverse('posts:post_detail', args=(pk,))
+        self.author_url = author_url
+        self.group_url = group_url
+
+    @property
+    def id(self):
+        return self.pk
+
+    def __eq__(self, other):
+        if isinstance(other, PostCard):
+            return self.pk == other.pk
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __repr__(self):
+        return f'<PostCard: {self.pk}>'
+
+
+@lru_cache(maxsize=4096)
+def profile_url(username):
+    return reverse('posts:profile', args=(username,))
+
+
+@lru_cache(maxsize=1024)
+def group_url(slug):
+    return reverse('posts:group_list', args=(slug,))
+
+
+def full_name(first_name, last_name):
+    # Как User.get_full_name()
+    return f'{first_name} {last_name}'.strip()
+
+
+def galleries(post_ids):
+    """Картинки галерей постов одним запросом: {pk поста: [файлы]}."""
+    result = {}
+    images = PostImage.objects.filter(post_id__in=post_ids).values_list(
+        'post_id', 'image'
+    )
+    for post_id, name in images:
+        result.setdefault(post_id, []).append(
+            GALLERY_IMAGE.attr_class(None, GALLERY_IMAGE, name)
+        )
+    return result
+
+
+def from_rows(page_rows):
+    page_rows = list(page_rows)
+    gallery = galleries([row['pk'] for row in page_rows])
+    return [
+        PostCard(
+            row['pk'],
+            row['text'],
+            row['pub_date'],
+            POST_IMAGE.attr_class(None, POST_IMAGE, row['image']),
+            gallery.get(row['pk'], ()),
+            full_name(row['author__first_name'], row['author__last_name']),
+            profile_url(row['author__username']),
+            group_url(row['group__slug']) if row['group__slug'] else None,
+        )
+        for row in page_rows
+    ]
+
+
+def from_posts(posts):
+    """Карточки из уже загруженных постов (выдача поиска)."""
+    return [
+        PostCard(
+            post.pk,
+            post.text,
+            post.pub_date,
+            post.image,
+            [picture.image for picture in post.images.all()],
+            post.author.get_full_name(),
+            profile_url(post.author.username),
+            group_url(post.group.slug) if post.group_id else None,
+        )
+        for post in posts
+    ]
+
+
+class LazyCards:
+    """Карточки страницы строятся при первом обращении, чтобы страница,
+    отданная из кэша фрагментов, не ходила в базу."""
+
+    __slots__ = ('source', 'cards')
+
+    def __init__(self, source):
+        self.source = source
+        self.cards = None
+
+    def load(self):
+        if self.cards is None:
+            if isinstance(self.source, QuerySet):
+                self.cards = from_rows(self.source.values(*CARD_FIELDS))
+            else:
+                self.cards = from_posts(self.source)
+        return self.cards
+
+    def __len__(self):
+        return len(self.load())
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __getitem__(self, index):
+        return self.load()[index]
+
+
+class CardPaginator(Paginator):
+    """Paginator, страницы которого состоят из PostCard. Из выборки
+    постов страница читается через values() без экземпляров моделей,
+    из другой последовательности (поиск) карточки строятся по постам."""
+
+    def _get_page(self, object_list, number, paginator):
+        return Page(LazyCards(object_list), number, paginator)
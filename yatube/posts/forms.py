@@ -1,9 +1,19 @@
 from django import forms
+from django.conf import settings
 
-from .models import Post, Comment
+from core import metrics
+
+from . import uploads
+from .models import Post, PostImage, Comment
+from .signals import invalidate_gallery
 
 
 class PostForm(forms.ModelForm):
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+        self.upload_token = None
+
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
@@ -18,6 +28,69 @@ class PostForm(forms.ModelForm):
             'image': 'Картинка',
         }
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        token = self.data.get('upload_token')
+        if self.files.get('image'):
+            metrics.upload_size.observe(self.files['image'].size, 'post')
+            return image
+        if not token or self.user is None:
+            return image
+        try:
+            uploads.check_completed(self.user, token)
+        except uploads.UploadError as error:
+            raise forms.ValidationError(str(error))
+        self.upload_token = token
+        return image
+
+    def save(self, commit=True):
+        """Картинка загрузки по частям открывается только на время
+        сохранения, поэтому с ней пост сохраняется сразу."""
+        if not self.upload_token:
+            return super().save(commit)
+        with uploads.open_completed(self.user, self.upload_token) as image:
+            self.instance.image = image
+            return super().save()
+
+
+class GalleryForm(forms.Form):
+    images = forms.ImageField(
+        label='Галерея',
+        help_text=(
+            f'Дополнительные картинки, не больше '
+            f'{settings.POST_IMAGES_LIMIT} на пост'
+        ),
+        required=False,
+        widget=forms.ClearableFileInput(attrs={'multiple': True}),
+    )
+
+    def __init__(self, *args, post=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.post = post
+
+    def clean_images(self):
+        files = self.files.getlist('images') if self.files else []
+        taken = self.post.images.count() if self.post else 0
+        if taken + len(files) > settings.POST_IMAGES_LIMIT:
+            raise forms.ValidationError(
+                f'К посту можно прикрепить не больше '
+                f'{settings.POST_IMAGES_LIMIT} картинок'
+            )
+        field = forms.ImageField()
+        for image in files:
+            metrics.upload_size.observe(image.size, 'gallery')
+        return [field.clean(image) for image in files]
+
+    def save(self, post):
+        start = post.images.count()
+        images = PostImage.objects.bulk_create(
+            PostImage(post=post, image=image, position=start + number)
+            for number, image in enumerate(self.cleaned_data['images'])
+        )
+        if images:
+            invalidate_gallery(post.pk)
+        return images
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,92 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from core.loadtest import session_key
+from .models import Group, Post
+from .views import NUMBER_OF_POSTS
+
+User = get_user_model()
+
+# Доли запросов в смеси: (маршрут, вес, только для вошедших)
+MIX = (
+    ('index', 40, False),
+    ('post_detail', 20, False),
+    ('profile', 15, False),
+    ('group_list', 10, False),
+    ('follow_index', 5, True),
+    ('add_comment', 5, True),
+    ('profile_follow', 3, True),
+    ('profile_unfollow', 2, True),
+)
+
+SAMPLE_SIZE = 1000
+
+
+class Scenario:
+    """Смесь запросов к posts по существующим в базе данным. Старые
+    страницы ленты запрашиваются реже первых, как у живых читателей."""
+
+    def __init__(self, seed=None):
+        rng = random.Random(seed)
+        post_ids = list(Post.objects.values_list('pk', flat=True))
+        self.post_ids = rng.sample(
+            post_ids, min(SAMPLE_SIZE, len(post_ids))
+        )
+        self.usernames = list(
+            User.objects.filter(posts__isnull=False).distinct()
+            .values_list('username', flat=True)[:SAMPLE_SIZE]
+        )
+        self.slugs = list(Group.objects.values_list('slug', flat=True))
+        self.pages = max(1, -(-len(post_ids) // NUMBER_OF_POSTS))
+        self.routes = [
+            (name, weight, logged_only) for name, weight, logged_only in MIX
+            if self.available(name)
+        ]
+
+    def available(self, name):
+        if name == 'group_list':
+            return bool(self.slugs)
+        if name in ('post_detail', 'add_comment'):
+            return bool(self.post_ids)
+        if name in ('profile', 'profile_follow', 'profile_unfollow'):
+            return bool(self.usernames)
+        return True
+
+    def request(self, rng, name):
+        if name == 'index':
+            page = min(self.pages, 1 + int(rng.expovariate(0.5)))
+            return 'get', reverse('posts:index'), {'page': page}
+        if name == 'post_detail':
+            post_id = rng.choice(self.post_ids)
+            return 'get', reverse('posts:post_detail', args=(post_id,)), None
+        if name == 'add_comment':
+            post_id = rng.choice(self.post_ids)
+            return (
+                'post', reverse('posts:add_comment', args=(post_id,)),
+                {'text': 'Комментарий нагрузочного теста'},
+            )
+        if name == 'group_list':
+            slug = rng.choice(self.slugs)
+            return 'get', reverse('posts:group_list', args=(slug,)), None
+        if name == 'follow_index':
+            return 'get', reverse('posts:follow_index'), None
+        username = rng.choice(self.usernames)
+        return 'get', reverse(f'posts:{name}', args=(username,)), None
+
+    def __call__(self, rng, logged_in):
+        routes = [
+            route for route in self.routes if logged_in or not route[2]
+        ]
+        name = rng.choices(
+            [route[0] for route in routes],
+            weights=[route[1] for route in routes],
+        )[0]
+        return (f'posts:{name}', *self.request(rng, name))
+
+
+def sessions(count):
+    """Сессии для count пользователей, которые будут ходить вошедшими."""
+    users = User.objects.filter(is_active=True).order_by('pk')[:count]
+    return [session_key(user) for user in users]
@@ -0,0 +1,90 @@
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from django.utils import timezone
+
+from posts.cards import GALLERY_IMAGE, POST_IMAGE, PostCard
+
+INCLUDE_LOOP = (
+    '{% for post in posts %}'
+    "{% include 'includes/post.html' with group_link=True "
+    'profile_link=True %}'
+    '{% if not forloop.last %}<hr>\n{% endif %}'
+    '{% endfor %}'
+)
+POST_CARDS = (
+    '{% load post_cards %}'
+    '{% post_cards posts group_link=True profile_link=True %}'
+)
+
+
+def sample_cards(count):
+    """Карточки без базы: у каждой второй есть картинка и галерея."""
+    now = timezone.now()
+    cards = []
+    for number in range(1, count + 1):
+        image = f'posts/bench{number}.jpg' if number % 2 else ''
+        cards.append(PostCard(
+            number,
+            f'Текст поста номер {number} ' * 10,
+            now,
+            POST_IMAGE.attr_class(None, POST_IMAGE, image),
+            [GALLERY_IMAGE.attr_class(None, GALLERY_IMAGE, image)]
+            if image else (),
+            f'Автор {number}',
+            f'/profile/author{number}/',
+            '/group/bench/' if number % 3 else None,
+        ))
+    return cards
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время отрисовки страницы ленты через include в цикле '
+        'и тегом post_cards, в микросекундах на карточку'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cards', type=int, default=10,
+            help='Карточек на странице',
+        )
+        parser.add_argument(
+            '--rounds', type=int, default=200,
+            help='Отрисовок страницы в одном замере',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Замеров; берётся лучший',
+        )
+
+    def handle(self, *args, **options):
+        if min(options['cards'], options['rounds'], options['repeat']) < 1:
+            raise CommandError('Значения должны быть положительными')
+        engine = engines['django']
+        context = {'posts': sample_cards(options['cards'])}
+        pages = {
+            'include': engine.from_string(INCLUDE_LOOP),
+            'post_cards': engine.from_string(POST_CARDS),
+        }
+        best = {name: float('inf') for name in pages}
+        for _ in range(options['repeat']):
+            # Замеры чередуются, чтобы фоновая нагрузка делилась поровну
+            for name, page in pages.items():
+                page.render(context)
+                elapsed = timeit.timeit(
+                    lambda: page.render(context), number=options['rounds']
+                )
+                best[name] = min(best[name], elapsed)
+        results = {}
+        for name in pages:
+            results[name] = (
+                best[name] / options['rounds'] / options['cards'] * 1e6
+            )
+            self.stdout.write(f'{name}: {results[name]:.1f} мкс на карточку')
+        saving = results['include'] - results['post_cards']
+        self.stdout.write(
+            f'Экономия: {saving:.1f} мкс на карточку '
+            f'({saving / results["include"]:.0%})'
+        )
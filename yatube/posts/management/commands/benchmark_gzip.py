@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from core.compression import compress
+from posts import warmup
+
+
+def feed_pages(pages, profiles):
+    """Тела страниц лент без сжатия, как их видит анонимный читатель."""
+    client = Client()
+    bodies = []
+    for route, path in warmup.targets(pages, profiles):
+        response = client.get(path)
+        if response.status_code != 200:
+            raise CommandError(f'{path}: {response.status_code}')
+        if response.streaming:
+            bodies.append(b''.join(response.streaming_content))
+        else:
+            bodies.append(response.content)
+    return bodies
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает уровни gzip на страницах лент: сколько байт экономит '
+        'сжатие и сколько процессора на это уходит'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages', type=int, default=3,
+            help='Сколько первых страниц ленты взять',
+        )
+        parser.add_argument(
+            '--profiles', type=int, default=5,
+            help='Сколько профилей популярных авторов взять',
+        )
+        parser.add_argument(
+            '--levels', type=int, nargs='+', default=[1, 6, 9],
+            help='Уровни сжатия',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Замеров; берётся лучший',
+        )
+
+    def handle(self, *args, **options):
+        if min(options['pages'], options['repeat']) < 1:
+            raise CommandError('Значения должны быть положительными')
+        if not all(1 <= level <= 9 for level in options['levels']):
+            raise CommandError('Уровень сжатия — от 1 до 9')
+        bodies = feed_pages(options['pages'], options['profiles'])
+        raw = sum(len(body) for body in bodies)
+        self.stdout.write(f'Страниц: {len(bodies)}, {raw} байт без сжатия')
+        for level in options['levels']:
+            best = float('inf')
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                sent = sum(len(compress(body, level)) for body in bodies)
+                best = min(best, time.perf_counter() - start)
+            saved = raw - sent
+            per_kilobyte = best / max(saved, 1) * 1024 * 1e6
+            self.stdout.write(
+                f'уровень {level}: {sent} байт (экономия {saved / raw:.0%}), '
+                f'{best / len(bodies) * 1e6:.0f} мкс на страницу, '
+                f'{per_kilobyte:.1f} мкс на сэкономленный КБ'
+            )
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.budgets import check_budgets
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет страницы posts и сравнивает с бюджетами по числу '
+        'запросов, времени и размеру; время имеет смысл проверять '
+        'на ненагруженной машине'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--report', help='Куда записать JSON-отчёт')
+        parser.add_argument(
+            '--skip-time',
+            action='store_true',
+            help='Не проверять время ответа',
+        )
+
+    def handle(self, *args, **options):
+        limits = ('queries', 'size') if options['skip_time'] else None
+        errors = check_budgets(options['report'], limits)
+        if errors:
+            raise CommandError('\n'.join(errors))
+        self.stdout.write(
+            self.style.SUCCESS('Страницы укладываются в бюджеты')
+        )
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import queryplans
+from posts.queryplans import BASELINE_PATH, collect_plans, missing_cases
+
+
+class Command(BaseCommand):
+    help = (
+        'Снимает EXPLAIN QUERY PLAN для запросов всех страниц posts '
+        'и сравнивает с эталоном'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--update',
+            action='store_true',
+            help='Перезаписать эталон текущими планами',
+        )
+        parser.add_argument('--baseline', default=BASELINE_PATH)
+
+    def handle(self, *args, **options):
+        missing = missing_cases()
+        if missing:
+            raise CommandError(
+                f'Нет сценария для маршрутов: {", ".join(sorted(missing))}'
+            )
+        baseline = queryplans.load_baseline(options['baseline'])
+        results = collect_plans()
+        if options['update']:
+            queryplans.save_baseline(
+                options['baseline'],
+                queryplans.build_baseline(results, baseline),
+            )
+            self.stdout.write(self.style.SUCCESS('Эталон обновлён'))
+            return
+        errors = []
+        for case, plans in results.items():
+            errors.extend(queryplans.compare(case, plans, baseline))
+        if errors:
+            raise CommandError('\n'.join(errors))
+        self.stdout.write(self.style.SUCCESS('Планы совпадают с эталоном'))
@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import loadtest
+from posts.loadtest import Scenario, sessions
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон смеси запросов к постам: RPS и процентили '
+        'времени ответа по маршрутам, сравнение с сохранённым отчётом'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера; без него запросы идут '
+                 'в WSGI-приложение этого процесса',
+        )
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Длительность прогона в секундах',
+        )
+        parser.add_argument(
+            '--requests', type=int,
+            help='Остановиться после стольких запросов',
+        )
+        parser.add_argument(
+            '--users', type=int, default=20,
+            help='Сколько пользователей ходят вошедшими',
+        )
+        parser.add_argument(
+            '--anonymous', type=float, default=0.5,
+            help='Доля анонимных виртуальных пользователей',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--save', help='Записать отчёт в JSON')
+        parser.add_argument(
+            '--baseline', help='Сравнить с ранее сохранённым отчётом',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимое ухудшение относительно эталона (доля)',
+        )
+
+    def handle(self, *args, **options):
+        test = loadtest.LoadTest(
+            Scenario(options['seed']),
+            sessions(options['users']),
+            base_url=options['url'],
+            concurrency=options['concurrency'],
+            anonymous=options['anonymous'],
+            seed=options['seed'],
+        )
+        report = test.run(options['duration'], options['requests'])
+        self.print_report(report)
+        if options['save']:
+            loadtest.save_report(options['save'], report)
+        if options['baseline']:
+            problems = loadtest.compare(
+                report,
+                loadtest.load_report(options['baseline']),
+                options['tolerance'],
+            )
+            if problems:
+                raise CommandError('\n'.join(problems))
+            self.stdout.write(self.style.SUCCESS('Не хуже эталона'))
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'Запросов: {report["requests"]} за {report["elapsed_s"]} с, '
+            f'{report["rps"]} в секунду, ошибок: {report["errors"]}'
+        )
+        self.stdout.write(
+            f'{"маршрут":<24}{"запросов":>10}{"ошибок":>8}'
+            f'{"p50":>9}{"p95":>9}{"p99":>9}'
+        )
+        for name, route in report['routes'].items():
+            self.stdout.write(
+                f'{name:<24}{route["requests"]:>10}{route["errors"]:>8}'
+                f'{route["p50_ms"]:>9}{route["p95_ms"]:>9}'
+                f'{route["p99_ms"]:>9}'
+            )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает инвертированный поисковый индекс постов (PostTerm)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Сколько постов читать и записывать за раз',
+        )
+
+    def handle(self, *args, **options):
+        done = 0
+        for done in search.rebuild_index(options['chunk_size']):
+            self.stdout.write(f'Проиндексировано постов: {done}')
+        self.stdout.write(self.style.SUCCESS(f'Готово, постов: {done}'))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search, seeding
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками для нагрузочных тестов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='За сколько последних дней распределить даты постов',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Одинаковое значение даёт одинаковые данные',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Сколько строк записывать в одной транзакции',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=0,
+            help='Число процессов для генерации строк (0 — без пула)',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['batch_size'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь и строка')
+        seeding.seed(options, log=self.stdout.write)
+        if search.backend() == 'index':
+            self.stdout.write(
+                'Посты записаны без сигналов: запустите rebuild_search_index'
+            )
+        self.stdout.write(self.style.SUCCESS('Готово'))
@@ -0,0 +1,62 @@
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import warmup
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогревает кэш после выкладки: первые страницы ленты, страницы '
+        'групп и профили самых популярных авторов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages', type=int, default=5,
+            help='Сколько первых страниц ленты прогреть',
+        )
+        parser.add_argument(
+            '--profiles', type=int, default=50,
+            help='Сколько профилей авторов с наибольшим числом подписчиков',
+        )
+        parser.add_argument(
+            '--parallel', type=int, default=4,
+            help='Сколько страниц запрашивать одновременно',
+        )
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера; без него страницы рисуются '
+                 'в этом процессе с тем же кэшем, что у сервера',
+        )
+
+    def handle(self, *args, **options):
+        if options['pages'] < 1 or options['parallel'] < 1:
+            raise CommandError('Нужна хотя бы одна страница и один поток')
+        start = time.perf_counter()
+        results = warmup.warm(
+            options['pages'],
+            options['profiles'],
+            parallel=options['parallel'],
+            base_url=options['url'],
+        )
+        elapsed = time.perf_counter() - start
+        routes = defaultdict(list)
+        errors = []
+        for route, path, status, duration in results:
+            routes[route].append(duration)
+            if status != 200:
+                errors.append(f'{path}: {status}')
+        for route, durations in routes.items():
+            self.stdout.write(
+                f'{route}: {len(durations)} стр., '
+                f'медленнейшая {max(durations):.0f} мс'
+            )
+        self.stdout.write(
+            f'Прогрето {len(results) - len(errors)} из {len(results)} '
+            f'за {elapsed:.1f} с'
+        )
+        if errors:
+            raise CommandError('\n'.join(errors))
+        self.stdout.write(self.style.SUCCESS('Готово'))
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='postimage',
+            options={'ordering': ('post_id', 'position', 'pk'), 'verbose_name': 'Картинка поста', 'verbose_name_plural': 'Картинки поста'},
+        ),
+        migrations.AddIndex(
+            model_name='postimage',
+            index=models.Index(fields=['post', 'position'], name='postimage_post_pos_idx'),
+        ),
+    ]
@@ -49,6 +49,15 @@ class Post(models.Model):
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(fields=('-pub_date',), name='post_pub_date_idx'),
+            models.Index(
+                fields=('author', '-pub_date'), name='post_author_date_idx'
+            ),
+            models.Index(
+                fields=('group', '-pub_date'), name='post_group_date_idx'
+            ),
+        )
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -56,6 +65,57 @@ class Post(models.Model):
         return self.text
 
 
+class PostImage(models.Model):
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='images',
+        verbose_name='Пост',
+    )
+    image = models.ImageField(
+        'Картинка',
+        upload_to='posts/',
+    )
+    position = models.PositiveSmallIntegerField(
+        'Порядок',
+        default=0,
+    )
+
+    class Meta:
+        # Начинается с поста, чтобы картинки нескольких постов
+        # (post_id IN (...)) читались по индексу без сортировки
+        ordering = ('post_id', 'position', 'pk')
+        indexes = (
+            models.Index(
+                fields=('post', 'position'), name='postimage_post_pos_idx'
+            ),
+        )
+        verbose_name = 'Картинка поста'
+        verbose_name_plural = 'Картинки поста'
+
+    def __str__(self) -> str:
+        return self.image.name
+
+
+class PostTerm(models.Model):
+    term = models.CharField('Слово', max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='terms',
+        verbose_name='Пост',
+    )
+    frequency = models.PositiveIntegerField('Число вхождений')
+
+    class Meta:
+        verbose_name = 'Слово поискового индекса'
+        verbose_name_plural = 'Поисковый индекс'
+        unique_together = ('term', 'post')
+
+    def __str__(self) -> str:
+        return self.term
+
+
 class Comment(models.Model):
     post = models.ForeignKey(
         Post,
@@ -81,6 +141,11 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = (
+            models.Index(
+                fields=('post', '-created'), name='comment_post_created_idx'
+            ),
+        )
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -102,5 +167,12 @@ class Follow(models.Model):
         verbose_name='Подписка'
     )
 
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('user', 'author'), name='follow_user_author_idx'
+            ),
+        )
+
     def __str__(self):
         return self.user.username
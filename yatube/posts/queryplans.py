@@ -0,0 +1,123 @@
+import os
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from core.queryplans import capture_plans
+from . import urls
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(__file__), 'tests', 'query_plans.json'
+)
+
+
+def seed(post_count=40):
+    users = [
+        User.objects.create_user(username=f'plan_user_{number}')
+        for number in range(5)
+    ]
+    groups = [
+        Group.objects.create(
+            title=f'Группа {number}',
+            slug=f'plan-group-{number}',
+            description='Группа для проверки планов',
+        )
+        for number in range(3)
+    ]
+    posts = [
+        Post.objects.create(
+            author=users[number % len(users)],
+            group=groups[number % len(groups)] if number % 2 else None,
+            text=f'Пост номер {number} про план запроса',
+        )
+        for number in range(post_count)
+    ]
+    for post in posts[:10]:
+        Comment.objects.create(post=post, author=users[0], text='Коммент')
+    for author in users[1:3]:
+        Follow.objects.create(user=users[0], author=author)
+    return SimpleNamespace(
+        user=users[0],
+        author=users[3],
+        group=groups[1],
+        post=posts[0],
+    )
+
+
+def cases(data):
+    """Запрос для каждого маршрута posts.urls: (метод, адрес, данные)."""
+    token = '0' * 32
+    return {
+        'index': ('get', reverse('posts:index'), None),
+        'group_list': (
+            'get', reverse('posts:group_list', args=(data.group.slug,)), None
+        ),
+        'profile': (
+            'get', reverse('posts:profile', args=(data.author.username,)),
+            None
+        ),
+        'post_detail': (
+            'get', reverse('posts:post_detail', args=(data.post.id,)), None
+        ),
+        'search': ('get', reverse('posts:search'), {'q': 'план запроса'}),
+        'post_create': ('get', reverse('posts:post_create'), None),
+        'post_edit': (
+            'get', reverse('posts:post_edit', args=(data.post.id,)), None
+        ),
+        'add_comment': (
+            'post', reverse('posts:add_comment', args=(data.post.id,)),
+            {'text': 'Новый комментарий'}
+        ),
+        'follow_index': ('get', reverse('posts:follow_index'), None),
+        'profile_follow': (
+            'get',
+            reverse('posts:profile_follow', args=(data.author.username,)),
+            None
+        ),
+        'profile_unfollow': (
+            'get',
+            reverse('posts:profile_unfollow', args=(data.author.username,)),
+            None
+        ),
+        'upload_start': ('post', reverse('posts:upload_start'), {'size': 0}),
+        'upload_chunk': (
+            'get', reverse('posts:upload_chunk', args=(token,)), None
+        ),
+        'upload_complete': (
+            'post', reverse('posts:upload_complete', args=(token,)), None
+        ),
+    }
+
+
+def missing_cases():
+    names = {pattern.name for pattern in urls.urlpatterns}
+    return names - set(cases(SimpleNamespace(
+        user=None,
+        author=SimpleNamespace(username='x'),
+        group=SimpleNamespace(slug='x'),
+        post=SimpleNamespace(id=1),
+    )))
+
+
+def collect_plans():
+    """Наполняет базу тестовыми данными, обходит все страницы и
+    откатывает изменения. Возвращает {маршрут: {отпечаток: план}}."""
+    results = {}
+    with transaction.atomic():
+        data = seed()
+        client = Client()
+        client.force_login(data.user)
+        for name, (method, url, payload) in cases(data).items():
+            cache.clear()
+            results[f'posts:{name}'] = capture_plans(
+                lambda: getattr(client, method)(url, payload or {})
+            )
+        transaction.set_rollback(True)
+    return results
@@ -0,0 +1,243 @@
+import math
+import operator
+import re
+from collections import Counter
+from functools import reduce
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import (Count, ExpressionWrapper, F, FloatField, Q,
+                              Sum, Value)
+from django.db.models.expressions import RawSQL
+from django.utils.functional import cached_property
+
+from .models import Post, PostTerm
+
+FTS_TABLE = 'posts_post_fts'
+
+# Вес совпадений в тексте поста и в названии группы для bm25
+TEXT_WEIGHT = 1.0
+GROUP_TITLE_WEIGHT = 0.5
+
+WORD_RE = re.compile(r'\w+')
+
+TERM_MAX_LENGTH = PostTerm._meta.get_field('term').max_length
+
+
+_fts_tables = {}
+
+
+def fts_available():
+    """Есть ли таблица FTS5; проверка кэшируется на базу, чтобы не
+    читать sqlite_master при каждом поиске."""
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts_tables:
+        with connection.cursor() as cursor:
+            _fts_tables[name] = (
+                FTS_TABLE in connection.introspection.table_names(cursor)
+            )
+    return _fts_tables[name]
+
+
+def backend():
+    """'fts' — индекс FTS5 в SQLite, 'index' — собственный
+    инвертированный индекс PostTerm, работающий на любой базе."""
+    if settings.SEARCH_BACKEND == 'auto':
+        return 'fts' if fts_available() else 'index'
+    return settings.SEARCH_BACKEND
+
+
+def normalize(text):
+    return [
+        word.replace('ё', 'е')[:TERM_MAX_LENGTH]
+        for word in WORD_RE.findall(text.lower())
+    ]
+
+
+def match_expression(query):
+    """Превращает пользовательский запрос в выражение MATCH для FTS5:
+    каждое слово ищется как префикс, все слова обязательны."""
+    return ' '.join(f'"{word}"*' for word in WORD_RE.findall(query.lower()))
+
+
+class SearchResults:
+    """Ленивая выборка для Paginator: считает и режет результаты
+    прямо в индексе и поднимает из базы только посты страницы.
+    Наследники определяют count() и ids(offset, limit)."""
+
+    def __init__(self, query, queryset=None):
+        if queryset is None:
+            queryset = Post.objects.all()
+        self.queryset = queryset
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        ids = self.ids(start, key.stop - start)
+        posts = self.queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+class FtsResults(SearchResults):
+    def __init__(self, query, queryset=None):
+        super().__init__(query, queryset)
+        self.expression = match_expression(query)
+
+    def count(self):
+        if not self.expression:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s',
+                [self.expression],
+            )
+            return cursor.fetchone()[0]
+
+    def ids(self, offset, limit):
+        if not self.expression:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, %s, %s) LIMIT %s OFFSET %s',
+                [
+                    self.expression,
+                    TEXT_WEIGHT,
+                    GROUP_TITLE_WEIGHT,
+                    limit,
+                    offset,
+                ],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+def prefix(word):
+    """Слова индекса, начинающиеся с word."""
+    return Q(term__startswith=word)
+
+
+class IndexResults(SearchResults):
+    """Пересечение списков вхождений PostTerm: пост попадает в выдачу,
+    если в нём есть все слова запроса (как префиксы), и ранжируется
+    по сумме tf * idf. Каждое слово считается отдельно: одно слово
+    поста может подходить к нескольким словам запроса («кот» и «котенок»
+    оба находят «котенок»)."""
+
+    def __init__(self, query, queryset=None):
+        super().__init__(query, queryset)
+        self.words = list(dict.fromkeys(normalize(query)))
+
+    @cached_property
+    def postings(self):
+        """Агрегированные вхождения по постам или None, если какого-то
+        слова нет в индексе и пересечение заведомо пустое."""
+        if not self.words:
+            return None
+        total = Post.objects.count()
+        prefixes = {word: prefix(word) for word in self.words}
+        # Документные частоты всех слов запроса одним запросом
+        frequencies = PostTerm.objects.filter(
+            reduce(operator.or_, prefixes.values())
+        ).aggregate(**{
+            f'word{number}': Count('post', distinct=True, filter=condition)
+            for number, condition in enumerate(prefixes.values())
+        })
+        weights = {}
+        for number, word in enumerate(prefixes):
+            frequency = frequencies[f'word{number}']
+            if not frequency:
+                return None
+            weights[word] = math.log(1 + total / frequency)
+        scores = [
+            Sum(
+                ExpressionWrapper(
+                    F('frequency') * Value(weight), output_field=FloatField()
+                ),
+                filter=prefixes[word],
+            )
+            for word, weight in weights.items()
+        ]
+        return PostTerm.objects.filter(
+            reduce(operator.or_, prefixes.values())
+        ).values('post').annotate(**{
+            f'word{number}': Count('term', filter=prefixes[word])
+            for number, word in enumerate(weights)
+        }).filter(**{
+            f'word{number}__gt': 0 for number in range(len(weights))
+        }).annotate(score=ExpressionWrapper(
+            reduce(operator.add, scores), output_field=FloatField()
+        ))
+
+    def count(self):
+        if self.postings is None:
+            return 0
+        return self.postings.count()
+
+    def ids(self, offset, limit):
+        if self.postings is None:
+            return []
+        rows = self.postings.order_by('-score', '-post')
+        return [row['post'] for row in rows[offset:offset + limit]]
+
+
+def search_posts(query, queryset=None):
+    if backend() == 'fts':
+        return FtsResults(query, queryset)
+    return IndexResults(query, queryset)
+
+
+def filter_posts(queryset, query):
+    """Оставляет в queryset только посты, найденные по индексу."""
+    if backend() == 'fts':
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [match_expression(query)],
+        ))
+    postings = IndexResults(query).postings
+    if postings is None:
+        return queryset.none()
+    return queryset.filter(pk__in=postings.values('post'))
+
+
+def index_rows(post):
+    return [
+        PostTerm(post_id=post.pk, term=term, frequency=frequency)
+        for term, frequency in Counter(normalize(post.text)).items()
+    ]
+
+
+def reindex_post(post):
+    with transaction.atomic():
+        PostTerm.objects.filter(post_id=post.pk).delete()
+        PostTerm.objects.bulk_create(index_rows(post))
+
+
+def rebuild_index(chunk_size=1000):
+    """Пересобирает PostTerm, читая посты потоком порциями по
+    chunk_size, и отдаёт число обработанных постов после каждой порции.
+    Всё идёт одной транзакцией: до её конца поиск видит прежний индекс,
+    а при ошибке он остаётся как был."""
+    with transaction.atomic():
+        PostTerm.objects.all().delete()
+        posts = Post.objects.order_by('pk').only('pk', 'text').iterator(
+            chunk_size=chunk_size
+        )
+        done = 0
+        rows = []
+        for post in posts:
+            rows.extend(index_rows(post))
+            done += 1
+            if done % chunk_size == 0:
+                PostTerm.objects.bulk_create(rows, batch_size=chunk_size)
+                rows = []
+                yield done
+        PostTerm.objects.bulk_create(rows, batch_size=chunk_size)
+    yield done
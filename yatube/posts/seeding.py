@@ -0,0 +1,295 @@
+import itertools
+import random
+from datetime import timedelta
+from multiprocessing import Pool
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from faker import Faker
+
+from core.cache_tags import invalidate
+
+from .models import Comment, Follow, Group, Post
+from .signals import FEED_TAG
+
+User = get_user_model()
+
+USERNAME_PREFIX = 'seed_'
+
+# Параметр распределения Парето: чем меньше, тем сильнее перекос
+# популярности авторов и их активности
+PARETO_ALPHA = 1.2
+
+
+def rng_for(seed, kind, number):
+    """Отдельный генератор на каждую порцию: результат не зависит
+    от числа процессов и порядка, в котором порции посчитаны."""
+    return random.Random(f'{seed}:{kind}:{number}')
+
+
+def pareto_weights(seed, kind, count):
+    rng = rng_for(seed, kind, 'weights')
+    return list(itertools.accumulate(
+        rng.paretovariate(PARETO_ALPHA) for _ in range(count)
+    ))
+
+
+class Vocabulary:
+    def __init__(self, seed):
+        fake = Faker('ru_RU')
+        fake.seed_instance(seed)
+        self.words = fake.words(nb=2000)
+        self.first_names = [fake.first_name() for _ in range(300)]
+        self.last_names = [fake.last_name() for _ in range(300)]
+
+    def sentence(self, rng, low, high):
+        words = rng.choices(self.words, k=rng.randint(low, high))
+        return ' '.join(words).capitalize() + '.'
+
+
+class Plan:
+    """Всё, что нужно рабочему процессу для генерации любой порции."""
+
+    def __init__(self, options, user_ids, group_ids, post_range):
+        self.seed = options['seed']
+        self.batch_size = options['batch_size']
+        self.days = options['days']
+        self.now = timezone.now()
+        self.user_ids = user_ids
+        self.group_ids = group_ids
+        self.post_range = post_range
+        self.vocabulary = Vocabulary(self.seed)
+        self.author_weights = pareto_weights(
+            self.seed, 'authors', len(user_ids)
+        )
+        self.popularity = pareto_weights(self.seed, 'followed', len(user_ids))
+
+
+_plan = None
+
+
+def _init_worker(plan):
+    global _plan
+    _plan = plan
+
+
+def post_rows(number, count):
+    """Посты порции пачками: автор пишет несколько постов подряд
+    с интервалом в минуты, активность авторов распределена по Парето."""
+    plan = _plan
+    rng = rng_for(plan.seed, 'posts', number)
+    rows = []
+    while len(rows) < count:
+        author_id = rng.choices(
+            plan.user_ids, cum_weights=plan.author_weights
+        )[0]
+        group_id = None
+        if plan.group_ids and rng.random() < 0.6:
+            group_id = rng.choice(plan.group_ids)
+        moment = plan.now - timedelta(
+            seconds=rng.uniform(0, plan.days * 86400)
+        )
+        burst = 1 + int(rng.expovariate(0.4))
+        for _ in range(min(burst, count - len(rows))):
+            rows.append((
+                author_id,
+                group_id,
+                plan.vocabulary.sentence(rng, 5, 40),
+                min(moment, plan.now),
+            ))
+            moment += timedelta(minutes=rng.expovariate(0.1))
+    return rows
+
+
+def comment_rows(number, count):
+    plan = _plan
+    rng = rng_for(plan.seed, 'comments', number)
+    first, last = plan.post_range
+    rows = []
+    for _ in range(count):
+        # Популярные посты свежие: чаще берём посты с большими id
+        post_id = last - int((last - first) * rng.random() ** 3)
+        rows.append((
+            post_id,
+            rng.choice(plan.user_ids),
+            plan.vocabulary.sentence(rng, 2, 15),
+        ))
+    return rows
+
+
+def follow_rows(number, count):
+    """Подписки порции: у каждого подписчика своё число подписок,
+    авторы выбираются пропорционально популярности без повторов."""
+    plan = _plan
+    rng = rng_for(plan.seed, 'follows', number)
+    rows = []
+    users = len(plan.user_ids)
+    while len(rows) < count:
+        follower = rng.choice(plan.user_ids)
+        wanted = min(1 + int(rng.paretovariate(PARETO_ALPHA)), users - 1)
+        authors = set()
+        for _ in range(wanted * 4):
+            author = rng.choices(
+                plan.user_ids, cum_weights=plan.popularity
+            )[0]
+            if author != follower:
+                authors.add(author)
+            if len(authors) >= wanted:
+                break
+        rows.extend((follower, author) for author in sorted(authors))
+    return rows[:count]
+
+
+def batches(total, batch_size, first=0):
+    for number, start in enumerate(range(0, total, batch_size), first):
+        yield number, min(batch_size, total - start)
+
+
+def _generate(job):
+    function, number, count = job
+    return function(number, count)
+
+
+def generate(plan, function, total, workers, first=0):
+    """Отдаёт порции строк по порядку, нумеруя их с first; при
+    workers > 0 строки считаются в пуле процессов, а в базу пишет
+    только основной."""
+    jobs = (
+        (function, number, count)
+        for number, count in batches(total, plan.batch_size, first)
+    )
+    if not workers:
+        _init_worker(plan)
+        yield from map(_generate, jobs)
+        return
+    with Pool(workers, initializer=_init_worker, initargs=(plan,)) as pool:
+        yield from pool.imap(_generate, jobs)
+
+
+def create_posts(rows):
+    """Пишет порцию постов. bulk_create ставит pub_date текущим временем
+    (auto_now_add), поэтому настоящие даты проставляются вторым
+    запросом."""
+    with transaction.atomic():
+        before = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        Post.objects.bulk_create(
+            Post(author_id=author_id, group_id=group_id, text=text)
+            for author_id, group_id, text, _ in rows
+        )
+        # Ключи из bulk_create в одной базе идут подряд
+        ids = Post.objects.filter(pk__gt=before).order_by('pk').values_list(
+            'pk', flat=True
+        )
+        Post.objects.bulk_update(
+            [Post(pk=pk, pub_date=row[3]) for pk, row in zip(ids, rows)],
+            ['pub_date'],
+        )
+
+
+def create_follows(plan, total, workers):
+    """Пишет total подписок без повторов пар (подписчик, автор), в том
+    числе уже бывших в базе. Повторы отбрасываются, а недостающие строки
+    досчитываются следующими по номеру порциями, так что результат
+    по-прежнему зависит только от seed. Возвращает число подписок."""
+    user_ids = plan.user_ids
+    seen = set(Follow.objects.filter(user_id__in=user_ids).values_list(
+        'user_id', 'author_id'
+    ))
+    possible = len(user_ids) * (len(user_ids) - 1)
+    wanted = min(total, possible - len(seen))
+    created = 0
+    first = 0
+    while created < wanted:
+        for rows in generate(
+            plan, follow_rows, wanted - created, workers, first
+        ):
+            first += 1
+            fresh = [pair for pair in dict.fromkeys(rows) if pair not in seen]
+            fresh = fresh[:wanted - created]
+            seen.update(fresh)
+            created += len(fresh)
+            with transaction.atomic():
+                Follow.objects.bulk_create(
+                    Follow(user_id=user_id, author_id=author_id)
+                    for user_id, author_id in fresh
+                )
+    return created
+
+
+def create_users(options):
+    vocabulary = Vocabulary(options['seed'])
+    rng = rng_for(options['seed'], 'users', 0)
+    password = make_password(None)
+    start = User.objects.filter(
+        username__startswith=USERNAME_PREFIX
+    ).count()
+    for number, count in batches(options['users'], options['batch_size']):
+        offset = start + number * options['batch_size']
+        with transaction.atomic():
+            User.objects.bulk_create(
+                User(
+                    username=f'{USERNAME_PREFIX}{offset + index}',
+                    first_name=rng.choice(vocabulary.first_names),
+                    last_name=rng.choice(vocabulary.last_names),
+                    password=password,
+                )
+                for index in range(count)
+            )
+    return list(
+        User.objects.filter(username__startswith=USERNAME_PREFIX)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+
+
+def create_groups(options):
+    vocabulary = Vocabulary(options['seed'])
+    rng = rng_for(options['seed'], 'groups', 0)
+    start = Group.objects.filter(slug__startswith=USERNAME_PREFIX).count()
+    Group.objects.bulk_create(
+        Group(
+            title=vocabulary.sentence(rng, 1, 3).rstrip('.'),
+            slug=f'{USERNAME_PREFIX}{start + number}',
+            description=vocabulary.sentence(rng, 5, 20),
+        )
+        for number in range(options['groups'])
+    )
+    return list(
+        Group.objects.filter(slug__startswith=USERNAME_PREFIX)
+        .values_list('pk', flat=True)
+    )
+
+
+def seed(options, log=lambda message: None):
+    user_ids = create_users(options)
+    log(f'Пользователей: {len(user_ids)}')
+    group_ids = create_groups(options)
+    log(f'Групп: {len(group_ids)}')
+    plan = Plan(options, user_ids, group_ids, post_range=None)
+    workers = options['workers']
+    before = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+    for rows in generate(plan, post_rows, options['posts'], workers):
+        create_posts(rows)
+    # bulk_create не посылает сигналов, ленты сбрасываем сами
+    invalidate(FEED_TAG)
+    log(f'Постов: {options["posts"]}')
+    created = Post.objects.filter(pk__gt=before).aggregate(
+        first=Min('pk'), last=Max('pk')
+    )
+    if created['first'] is not None:
+        # Ключи из bulk_create в одной базе идут подряд
+        plan.post_range = (created['first'], created['last'])
+        for rows in generate(
+            plan, comment_rows, options['comments'], workers
+        ):
+            with transaction.atomic():
+                Comment.objects.bulk_create(
+                    Comment(post_id=post_id, author_id=author_id, text=text)
+                    for post_id, author_id, text in rows
+                )
+        log(f'Комментариев: {options["comments"]}')
+    if len(user_ids) > 1:
+        follows = create_follows(plan, options['follows'], workers)
+        log(f'Подписок: {follows}')
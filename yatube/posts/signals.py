@@ -0,0 +1,136 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from core.cache_tags import invalidate
+
+from . import search
+from .models import Comment, Follow, Group, Post, PostImage
+
+User = get_user_model()
+
+# Теги кэша: post:<id>, group:<slug>, author:<id>, follow:<id подписчика>
+# и feed:index — всё, что показывается в общих лентах.
+FEED_TAG = 'feed:index'
+
+
+@receiver(post_save, sender=Post)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    if not raw and search.backend() == 'index':
+        search.reindex_post(instance)
+
+
+@receiver(pre_save, sender=Post)
+def invalidate_previous_group(sender, instance, raw=False, **kwargs):
+    # Пост, перенесённый в другую группу, пропадает из ленты прежней
+    if raw or instance.pk is None:
+        return
+    slug = Post.objects.filter(pk=instance.pk).values_list(
+        'group__slug', flat=True
+    ).first()
+    if slug:
+        invalidate(f'group:{slug}')
+
+
+def post_tags(post_id, author_id, slug):
+    """Теги всех страниц, где видна карточка поста."""
+    tags = [f'post:{post_id}', f'author:{author_id}', FEED_TAG]
+    if slug:
+        tags.append(f'group:{slug}')
+    return tags
+
+
+def invalidate_gallery(post_id):
+    """Галерея видна в карточке поста во всех лентах. Нужна и после
+    bulk_create картинок, который не посылает сигналов."""
+    row = Post.objects.filter(pk=post_id).values_list(
+        'author_id', 'group__slug'
+    ).first()
+    if row is None:
+        invalidate(f'post:{post_id}', FEED_TAG)
+    else:
+        invalidate(*post_tags(post_id, *row))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    invalidate(*post_tags(
+        instance.pk,
+        instance.author_id,
+        instance.group.slug if instance.group_id else None,
+    ))
+
+
+@receiver(post_save, sender=PostImage)
+@receiver(post_delete, sender=PostImage)
+def invalidate_post_image(sender, instance, **kwargs):
+    invalidate_gallery(instance.post_id)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment(sender, instance, **kwargs):
+    invalidate(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    # Профили авторов группы ссылаются на неё; до удаления, пока у постов
+    # ещё не обнулена группа
+    authors = Post.objects.filter(group=instance).values_list(
+        'author_id', flat=True
+    ).distinct()
+    invalidate(
+        f'group:{instance.slug}', FEED_TAG,
+        *(f'author:{author_id}' for author_id in authors),
+    )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(sender, instance, **kwargs):
+    invalidate(f'follow:{instance.user_id}')
+
+
+# Поля пользователя, которые видны в карточках и профиле
+DISPLAYED_USER_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def displayed(user):
+    return tuple(getattr(user, name) for name in DISPLAYED_USER_FIELDS)
+
+
+@receiver(pre_save, sender=User)
+def remember_displayed_fields(sender, instance, update_fields=None,
+                              **kwargs):
+    if instance.pk is None:
+        return
+    if update_fields and not set(update_fields) & set(DISPLAYED_USER_FIELDS):
+        # Например, last_login при каждом входе
+        instance._displayed_before = displayed(instance)
+        return
+    instance._displayed_before = User.objects.filter(
+        pk=instance.pk
+    ).values_list(*DISPLAYED_USER_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_author(sender, instance, created=False, **kwargs):
+    # Новый пользователь ещё нигде не показан, а правка без видимых полей
+    # (вход, смена пароля) лент не меняет
+    before = instance.__dict__.pop('_displayed_before', None)
+    if created or before == displayed(instance):
+        return
+    # Страницы групп, где он писал, показывают его имя и профиль
+    slugs = Group.objects.filter(posts__author=instance).values_list(
+        'slug', flat=True
+    ).distinct()
+    invalidate(
+        f'author:{instance.pk}', FEED_TAG,
+        *(f'group:{slug}' for slug in slugs),
+    )
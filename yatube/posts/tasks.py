@@ -0,0 +1,32 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+
+from core import media
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='post-images')
+
+
+def render_post_images(paths):
+    for path in paths:
+        for geometry in settings.POST_IMAGE_GEOMETRIES:
+            try:
+                media.get_variant(geometry, path)
+            except (OSError, ValueError):
+                logger.warning('Не удалось подготовить %s %s', geometry, path)
+
+
+def schedule_post_images(post):
+    """Готовит миниатюры всех картинок поста одной фоновой задачей
+    после фиксации транзакции."""
+    paths = [picture.image.name for picture in post.images.all()]
+    if post.image:
+        paths.insert(0, post.image.name)
+    if paths:
+        transaction.on_commit(
+            lambda: executor.submit(render_post_images, paths)
+        )
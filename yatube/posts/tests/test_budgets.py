@@ -0,0 +1,26 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase
+
+from posts.budgets import check_budgets
+
+
+class PerformanceBudgetTests(TestCase):
+    """Страницы укладываются в бюджеты posts.budgets.BUDGETS по числу
+    запросов и размеру. Время зависит от загрузки машины и проверяется
+    только командой check_budgets. Отчёт с замерами пишется во временный
+    каталог, а не в settings.PERF_BUDGET_REPORT рядом с исходниками."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.report = os.path.join(directory, 'perf_budget_report.json')
+
+    def test_pages_fit_budgets(self):
+        errors = check_budgets(self.report, limits=('queries', 'size'))
+        self.assertEqual(errors, [], '\n'.join(errors))
+        with open(self.report, encoding='utf-8') as report:
+            self.assertTrue(json.load(report))
@@ -1,12 +1,17 @@
+import io
+import threading
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils.datastructures import MultiValueDict
 from django.conf import settings
 
-from posts.forms import PostForm
+from posts import uploads
+from posts.forms import GalleryForm, PostForm
 from posts.models import Group, Post, Comment
 
 import tempfile
@@ -299,3 +304,224 @@ class PostFormTests(TestCase):
         self.assertEqual(Comment.objects.count(), comments_count)
         self.assertRedirects(
             response, f'/auth/login/?next=/posts/{self.post.id}/comment/')
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    CHUNKED_UPLOAD_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR),
+)
+class ChunkedUploadTests(TestCase):
+    small_gif = (
+        b'\x47\x49\x46\x38\x39\x61\x01\x00'
+        b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+        b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+        b'\x00\x00\x01\x00\x01\x00\x00\x02'
+        b'\x02\x4c\x01\x00\x3b'
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.CHUNKED_UPLOAD_ROOT, ignore_errors=True)
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def send_chunk(self, token, offset, chunk):
+        return self.authorized_client.generic(
+            'PATCH',
+            reverse('posts:upload_chunk', args=(token,)),
+            data=chunk,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_chunked_upload_creates_post(self):
+        """Картинка, загруженная кусками, прикрепляется к посту по токену."""
+        response = self.authorized_client.post(
+            reverse('posts:upload_start'),
+            {'filename': 'chunked.gif', 'size': len(self.small_gif)}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        token = response.json()['token']
+        half = len(self.small_gif) // 2
+        self.send_chunk(token, 0, self.small_gif[:half])
+        response = self.send_chunk(token, 0, self.small_gif[half:])
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT)
+        self.assertEqual(response.json()['offset'], half)
+        response = self.authorized_client.get(
+            reverse('posts:upload_chunk', args=(token,))
+        )
+        self.assertEqual(response.json()['offset'], half)
+        self.send_chunk(token, half, self.small_gif[half:])
+        response = self.authorized_client.post(
+            reverse('posts:upload_complete', args=(token,))
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост с докачкой', 'upload_token': token}
+        )
+        post = Post.objects.get(text='Пост с докачкой')
+        self.assertEqual(post.image.name, 'posts/chunked.gif')
+        self.assertEqual(post.image.read(), self.small_gif)
+        response = self.authorized_client.get(
+            reverse('posts:upload_chunk', args=(token,))
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_incomplete_upload_is_rejected(self):
+        """Незавершённую загрузку нельзя прикрепить к посту."""
+        response = self.authorized_client.post(
+            reverse('posts:upload_start'),
+            {'filename': 'chunked.gif', 'size': len(self.small_gif)}
+        )
+        token = response.json()['token']
+        response = self.authorized_client.post(
+            reverse('posts:upload_complete', args=(token,))
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост без картинки', 'upload_token': token}
+        )
+        self.assertTrue(response.context['form'].errors['image'])
+        self.assertFalse(
+            Post.objects.filter(text='Пост без картинки').exists()
+        )
+
+    def test_completed_upload_is_closed_after_use(self):
+        token = uploads.start(self.user, 'chunked.gif', len(self.small_gif))
+        uploads.append(
+            self.user, token, 0, io.BytesIO(self.small_gif),
+            len(self.small_gif),
+        )
+        uploads.complete(self.user, token)
+        with uploads.open_completed(self.user, token) as image:
+            self.assertEqual(image.read(), self.small_gif)
+        self.assertTrue(image.closed)
+
+    def test_concurrent_chunks_do_not_interleave(self):
+        """Пока один запрос дописывает кусок, второй с тем же смещением
+        ждёт и получает новое смещение, а не пишет вперемешку."""
+        token = uploads.start(self.user, 'chunked.gif', len(self.small_gif))
+        reading = threading.Event()
+        release = threading.Event()
+
+        class SlowStream(io.BytesIO):
+            def read(self, size):
+                reading.set()
+                release.wait(5)
+                return super().read(size)
+
+        results = []
+
+        def send(stream):
+            try:
+                results.append(uploads.append(
+                    self.user, token, 0, stream, len(self.small_gif)
+                ))
+            except uploads.OffsetMismatch as error:
+                results.append(f'offset {error.offset}')
+
+        first = threading.Thread(
+            target=send, args=(SlowStream(self.small_gif),)
+        )
+        first.start()
+        reading.wait(5)
+        second = threading.Thread(
+            target=send, args=(io.BytesIO(self.small_gif),)
+        )
+        second.start()
+        second.join(0.2)
+        release.set()
+        first.join()
+        second.join()
+        size = len(self.small_gif)
+        self.assertEqual(results, [size, f'offset {size}'])
+        self.assertEqual(uploads.offset(self.user, token), size)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GalleryFormTests(TestCase):
+    small_gif = ChunkedUploadTests.small_gif
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='gallery')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def gifs(self, count):
+        return [
+            SimpleUploadedFile(f'gallery{number}.gif', self.small_gif)
+            for number in range(count)
+        ]
+
+    def test_post_create_with_gallery(self):
+        """Пост создаётся с несколькими картинками по порядку."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост с галереей', 'images': self.gifs(2)}
+        )
+        post = Post.objects.get(text='Пост с галереей')
+        self.assertEqual(
+            [picture.position for picture in post.images.all()], [0, 1]
+        )
+
+    def test_gallery_changes_reach_cached_pages(self):
+        """Добавленные и удалённые картинки галереи видны в закэшированных
+        ленте группы и профиле, хотя bulk_create не посылает сигналов."""
+        group = Group.objects.create(title='Группа', slug='gallery-group')
+        post = Post.objects.create(author=self.user, group=group, text='Пост')
+        urls = (
+            reverse('posts:group_list', args=(group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+        )
+        for url in urls:
+            self.assertNotContains(self.authorized_client.get(url), 'card-img')
+        gallery = GalleryForm(
+            files=MultiValueDict({'images': self.gifs(2)}), post=post
+        )
+        self.assertTrue(gallery.is_valid())
+        gallery.save(post)
+        for url in urls:
+            self.assertContains(
+                self.authorized_client.get(url), 'card-img', count=2
+            )
+        post.images.first().delete()
+        for url in urls:
+            self.assertContains(
+                self.authorized_client.get(url), 'card-img', count=1
+            )
+
+    @override_settings(POST_IMAGES_LIMIT=2)
+    def test_gallery_limit(self):
+        """Больше POST_IMAGES_LIMIT картинок прикрепить нельзя."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        self.authorized_client.post(
+            reverse('posts:post_edit', args=(post.id,)),
+            {'text': 'Пост', 'images': self.gifs(2)}
+        )
+        response = self.authorized_client.post(
+            reverse('posts:post_edit', args=(post.id,)),
+            {'text': 'Пост', 'images': self.gifs(1)}
+        )
+        self.assertTrue(response.context['gallery'].errors['images'])
+        self.assertEqual(post.images.count(), 2)
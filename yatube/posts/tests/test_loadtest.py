@@ -0,0 +1,37 @@
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TransactionTestCase
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class LoadTestCommandTests(TransactionTestCase):
+    """Проверка команды loadtest. Запросы идут из потоков пула со своими
+    соединениями, поэтому данные должны быть закоммичены."""
+
+    def setUp(self):
+        cache.clear()
+        group = Group.objects.create(
+            title='Группа', slug='load-group', description='Описание'
+        )
+        for username in ('reader', 'writer'):
+            author = User.objects.create_user(username=username)
+            Post.objects.create(author=author, group=group, text='Пост')
+
+    def test_wsgi_run(self):
+        """Прогон через WsgiTransport делает заданное число запросов
+        без ошибок и печатает таблицу маршрутов."""
+        out = io.StringIO()
+        call_command(
+            'loadtest', requests=6, concurrency=2, users=1,
+            anonymous=0.5, duration=30, stdout=out,
+        )
+        output = out.getvalue()
+        self.assertIn('Запросов: 6 за', output)
+        self.assertIn('ошибок: 0', output)
+        self.assertIn('posts:', output)
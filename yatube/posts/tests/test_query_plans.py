@@ -0,0 +1,37 @@
+from django.test import TestCase
+
+from core import queryplans
+from posts.queryplans import BASELINE_PATH, collect_plans, missing_cases
+
+
+class QueryPlansTests(TestCase):
+    """Планы запросов страниц posts не хуже эталона query_plans.json.
+    После намеренных изменений эталон обновляется командой
+    ``manage.py check_query_plans --update``."""
+
+    def test_every_view_has_case(self):
+        """Для каждого маршрута posts.urls есть сценарий проверки."""
+        self.assertEqual(missing_cases(), set())
+
+    def test_plans_match_baseline(self):
+        """Нет полных сканирований и сортировок во временном дереве
+        сверх разрешённых, планы совпадают с эталоном."""
+        baseline = queryplans.load_baseline(BASELINE_PATH)
+        errors = []
+        for case, plans in collect_plans().items():
+            errors.extend(queryplans.compare(case, plans, baseline))
+        self.assertEqual(errors, [], '\n'.join(errors))
+
+    def test_problems_detects_bad_plans(self):
+        """Полное сканирование и временное дерево считаются проблемами."""
+        self.assertEqual(
+            len(queryplans.problems([
+                'SCAN posts_post',
+                'USE TEMP B-TREE FOR ORDER BY',
+            ])),
+            2
+        )
+        self.assertEqual(queryplans.problems([
+            'SCAN posts_post USING INDEX post_pub_date_idx',
+            'SEARCH auth_user USING INTEGER PRIMARY KEY (rowid=?)',
+        ]), [])
@@ -1,13 +1,26 @@
+from io import StringIO
+from unittest import mock
+
 from django import forms
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.paginator import Page
 from django.conf import settings
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.template import engines
+from django.test.utils import CaptureQueriesContext
 
+from posts import search
+from posts.cards import PostCard
 from posts.forms import CommentForm
-from posts.models import Group, Post, Comment, Follow
+from posts.management.commands.benchmark_cards import (
+    INCLUDE_LOOP, POST_CARDS, sample_cards
+)
+from posts.models import Group, Post, PostImage, PostTerm, Comment, Follow
 
 import shutil
 import tempfile
@@ -106,7 +119,9 @@ class PostsPagesTests(TestCase):
     def test_index_page_show_correct_context(self):
         """Шаблон index с соответствующим контекстом."""
         response = self.guest_client.get(reverse('posts:index'))
-        self.assertIn(self.post, response.context['page_obj'])
+        self.assertIn(
+            self.post.pk, [post.pk for post in response.context['page_obj']]
+        )
 
     def test_group_list_show_correct_context(self):
         """Шаблон group_list с соответствующим контекстом."""
@@ -120,6 +135,20 @@ class PostsPagesTests(TestCase):
             Post.objects.filter(group__slug='test-slug').count()
         )
 
+    def test_empty_group_says_so(self):
+        """Пустая группа показывает сообщение вместо карточек."""
+        Group.objects.create(
+            title='Пустая группа', slug='empty-slug', description='Пусто'
+        )
+        response = self.guest_client.get(
+            reverse('posts:group_list', kwargs={'slug': 'empty-slug'})
+        )
+        self.assertContains(response, 'В этой группе пока нет записей.')
+        response = self.guest_client.get(
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        )
+        self.assertNotContains(response, 'В этой группе пока нет записей.')
+
     def test_profile_show_correct_context(self):
         """Шаблон profile с соответствующим контекстом."""
         response = self.guest_client.get(
@@ -196,10 +225,42 @@ class PostsPagesTests(TestCase):
             with self.subTest(reverse_name=reverse_name):
                 response = self.guest_client.get(reverse_name)
                 self.assertIn(
-                    self.post_with_group,
-                    response.context['page_obj']
+                    self.post_with_group.pk,
+                    [post.pk for post in response.context['page_obj']]
                 )
 
+    def test_feed_images_loaded_with_one_query(self):
+        """Картинки галерей всех постов страницы грузятся одним запросом."""
+        for post in (self.post, self.post_with_group):
+            PostImage.objects.create(post=post, image='posts/gallery.gif')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(reverse('posts:index'))
+        image_queries = [
+            query for query in queries.captured_queries
+            if 'posts_postimage' in query['sql']
+        ]
+        self.assertEqual(len(image_queries), 1)
+        self.assertContains(response, 'posts/gallery.gif', count=2)
+
+    def test_feed_page_consists_of_cards(self):
+        """Страница ленты — Page из PostCard с готовыми адресами."""
+        response = self.guest_client.get(reverse('posts:index'))
+        page_obj = response.context['page_obj']
+        self.assertIsInstance(page_obj, Page)
+        cards = {card.pk: card for card in page_obj}
+        card = cards[self.post.pk]
+        self.assertIsInstance(card, PostCard)
+        self.assertEqual(card.image.name, self.post.image.name)
+        self.assertEqual(card.url, reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        ))
+        self.assertIsNone(card.group_url)
+        self.assertFalse(cards[self.post_with_group.pk].image)
+        self.assertEqual(
+            cards[self.post_with_group.pk].group_url,
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+        )
+
     def test_post_with_group_not_in_new_group(self):
         """Post_with_group не попал в группу, для которой
         не был предназначен."""
@@ -287,6 +348,7 @@ class CacheTests(TestCase):
             text='Тестовый текст поста кэш')
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.user = User.objects.create_user(username='test_user1')
         self.authorized_client = Client()
@@ -300,15 +362,66 @@ class CacheTests(TestCase):
     def test_cache_index(self):
         """Тест кэширования страницы index.html"""
         state_1 = self.authorized_client.get(reverse('posts:index'))
-        post_1 = Post.objects.get(pk=1)
-        post_1.text = 'Измененный текст кэш'
-        post_1.save()
+        # update() не посылает сигналов, и кэш о правке не узнаёт
+        Post.objects.filter(pk=self.post.pk).update(
+            text='Измененный текст кэш'
+        )
         state_2 = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(state_1.content, state_2.content)
         cache.clear()
         state_3 = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(state_1.content, state_3.content)
 
+    def test_cache_index_invalidated_on_post_save(self):
+        """Сохранение поста сбрасывает кэш ленты по тегу feed:index"""
+        self.authorized_client.get(reverse('posts:index'))
+        self.post.text = 'Текст после сохранения'
+        self.post.save()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Текст после сохранения')
+
+    def test_cached_index_keeps_tabs_for_logged_in_user(self):
+        """Вкладки лент зависят от входа и не попадают в общий кэш."""
+        tab = 'Избранные авторы'
+        self.assertNotContains(self.guest_client.get('/'), tab)
+        self.assertContains(self.authorized_client.get('/'), tab)
+        self.assertNotContains(self.guest_client.get('/'), tab)
+
+    def test_group_page_follows_author_rename(self):
+        """Смена имени автора сбрасывает страницы его групп."""
+        group = Group.objects.create(title='Группа', slug='cache-group')
+        Post.objects.filter(pk=self.post.pk).update(group=group)
+        url = reverse('posts:group_list', args=(group.slug,))
+        self.guest_client.get(url)
+        author = self.post.author
+        author.first_name = 'Переименованный'
+        author.save()
+        self.assertContains(self.guest_client.get(url), 'Переименованный')
+
+    def test_user_saves_without_visible_changes_keep_cache(self):
+        """Регистрация, вход и смена пароля не сбрасывают ленты."""
+        with mock.patch('posts.signals.invalidate') as invalidate:
+            user = User.objects.create_user(username='newcomer')
+            self.client.force_login(user)
+            user.set_password('новый-пароль')
+            user.save()
+            invalidate.assert_not_called()
+            user.last_name = 'Новичков'
+            user.save()
+            invalidate.assert_called_once()
+
+    def test_profile_follows_group_slug_change(self):
+        """Смена адреса группы сбрасывает профили её авторов."""
+        group = Group.objects.create(title='Группа', slug='old-slug')
+        Post.objects.filter(pk=self.post.pk).update(group=group)
+        url = reverse('posts:profile', args=(self.post.author.username,))
+        self.guest_client.get(url)
+        group.slug = 'new-slug'
+        group.save()
+        response = self.guest_client.get(url)
+        self.assertContains(response, '/group/new-slug/')
+        self.assertNotContains(response, '/group/old-slug/')
+
 
 class FollowTests(TestCase):
     """Тесты проверки работы механизма подписки на авторов"""
@@ -374,4 +487,236 @@ class FollowTests(TestCase):
         Follow.objects.create(user=self.follower, author=self.following)
         response = self.authorized_follower.get('/follow/')
         follower_index = response.context['page_obj'][0]
-        self.assertEqual(self.post, follower_index)
+        self.assertEqual(follower_index.pk, self.post.pk)
+
+
+class SearchViewTests(TestCase):
+    """Тесты полнотекстового поиска по постам"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='searcher')
+        cls.group = Group.objects.create(
+            title='Путешествия',
+            slug='travel',
+            description='Тестовое описание',
+        )
+        cls.post_about_cats = Post.objects.create(
+            author=cls.user,
+            text='Кошки любят спать. Кошки любят есть.',
+        )
+        cls.post_in_group = Post.objects.create(
+            author=cls.user,
+            text='Заметка про кошки и поезда',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, query):
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': query}
+        )
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_search_ranks_results(self):
+        """Более релевантный пост идёт первым, префиксы находятся."""
+        self.assertEqual(
+            self.search('кошк'),
+            [self.post_about_cats.pk, self.post_in_group.pk]
+        )
+
+    def test_search_by_group_title(self):
+        """Пост находится по названию своей группы."""
+        self.assertEqual(self.search('путешествия'), [self.post_in_group.pk])
+
+    def test_search_index_follows_changes(self):
+        """Индекс обновляется при изменении и удалении поста и группы."""
+        post = Post.objects.get(pk=self.post_about_cats.pk)
+        post.text = 'Собаки'
+        post.save()
+        self.assertEqual(self.search('собаки'), [post.pk])
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Поездки'
+        group.save()
+        self.assertEqual(self.search('поездки'), [self.post_in_group.pk])
+        Post.objects.filter(pk=self.post_in_group.pk).delete()
+        self.assertEqual(self.search('кошки'), [])
+
+    def test_empty_query(self):
+        """Пустой запрос ничего не находит."""
+        self.assertEqual(self.search('  ?! '), [])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через полнотекстовый индекс."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        self.guest_client.force_login(admin)
+        response = self.guest_client.get(
+            '/admin/posts/post/', {'q': 'путешествия'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.post_in_group]
+        )
+
+
+@override_settings(SEARCH_BACKEND='index')
+class IndexSearchViewTests(TestCase):
+    """Тесты поиска по инвертированному индексу PostTerm"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='searcher')
+        cls.post_about_cats = Post.objects.create(
+            author=cls.user,
+            text='Кошки любят спать. Кошки любят есть.',
+        )
+        cls.post_about_trains = Post.objects.create(
+            author=cls.user,
+            text='Заметка про кошки и поезда',
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, query):
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': query}
+        )
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_search_ranks_and_intersects(self):
+        """Выдача — пересечение слов запроса, частые вхождения выше."""
+        self.assertEqual(
+            self.search('кошк'),
+            [self.post_about_cats.pk, self.post_about_trains.pk]
+        )
+        self.assertEqual(
+            self.search('КОШКИ поезд'), [self.post_about_trains.pk]
+        )
+        self.assertEqual(self.search('кошки самолёт'), [])
+
+    def test_overlapping_words(self):
+        """Одно слово поста подходит сразу к нескольким словам запроса."""
+        post = Post.objects.create(author=self.user, text='Котенок спит')
+        self.assertEqual(self.search('кот котенок'), [post.pk])
+        self.assertEqual(self.search('котенок кот спит'), [post.pk])
+
+    def test_query_count_does_not_grow_with_words(self):
+        """Частоты всех слов запроса считаются одним запросом."""
+        results = search.IndexResults('кошки любят спать есть')
+        with self.assertNumQueries(3):
+            self.assertEqual(results.count(), 1)
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при сохранении и удалении поста."""
+        post = Post.objects.get(pk=self.post_about_cats.pk)
+        post.text = 'Собаки'
+        post.save()
+        self.assertEqual(self.search('кошки'), [self.post_about_trains.pk])
+        Post.objects.filter(pk=self.post_about_trains.pk).delete()
+        self.assertEqual(self.search('кошки'), [])
+
+    def test_rebuild_command(self):
+        """Команда rebuild_search_index восстанавливает индекс."""
+        PostTerm.objects.all().delete()
+        call_command('rebuild_search_index', chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.search('поезда'), [self.post_about_trains.pk])
+
+    def test_failed_rebuild_keeps_index(self):
+        """Упавшая пересборка не оставляет индекс пустым."""
+        with mock.patch(
+            'posts.search.index_rows', side_effect=DatabaseError('сбой')
+        ):
+            with self.assertRaises(DatabaseError):
+                list(search.rebuild_index())
+        self.assertEqual(self.search('поезда'), [self.post_about_trains.pk])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке работает и без FTS5."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        self.guest_client.force_login(admin)
+        response = self.guest_client.get(
+            '/admin/posts/post/', {'q': 'поезд'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list),
+            [self.post_about_trains]
+        )
+
+
+class PostCardsTagTests(TestCase):
+    """Проверка тега post_cards"""
+
+    def test_same_output_as_include_loop(self):
+        """Тег рисует то же, что include в цикле."""
+        context = {'posts': sample_cards(4)}
+        engine = engines['django']
+        self.assertEqual(
+            engine.from_string(POST_CARDS).render(context),
+            engine.from_string(INCLUDE_LOOP).render(context),
+        )
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command(
+            'benchmark_cards', cards=2, rounds=1, repeat=1, stdout=out
+        )
+        self.assertIn('Экономия', out.getvalue())
+
+
+@override_settings(STREAMING_FEEDS=True)
+class StreamingFeedTests(TestCase):
+    """Проверка потоковой отдачи лент"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='streamer')
+        cls.group = Group.objects.create(
+            title='Поток', slug='stream', description='Описание'
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.author, group=cls.group, text=f'Пост {number}')
+            for number in range(12)
+        )
+        Follow.objects.create(
+            user=User.objects.create_user(username='reader'),
+            author=cls.author,
+        )
+
+    def setUp(self):
+        self.client.force_login(User.objects.get(username='reader'))
+        cache.clear()
+
+    def test_head_goes_first(self):
+        """Шапка со стилями уходит раньше карточек."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertTrue(response.streaming)
+        first = next(iter(response.streaming_content)).decode()
+        self.assertIn('bootstrap.min.css', first)
+        self.assertNotIn('Пост ', first)
+
+    def test_same_page_as_regular_render(self):
+        """Потоковая страница совпадает с обычной до пробелов, и с
+        холодным кэшем, и из кэша."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'stream'}),
+            reverse('posts:profile', kwargs={'username': 'streamer'}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                with override_settings(STREAMING_FEEDS=False):
+                    expected = self.client.get(url).content.decode().split()
+                cache.clear()
+                for _ in range(2):
+                    response = self.client.get(url)
+                    content = b''.join(response.streaming_content).decode()
+                    self.assertEqual(content.split(), expected)
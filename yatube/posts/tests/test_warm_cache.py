@@ -0,0 +1,63 @@
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import warmup
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class WarmCacheCommandTests(TestCase):
+    """Проверка команды warm_cache"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(
+            title='Группа', slug='warm-group', description='Описание'
+        )
+        cls.popular = User.objects.create_user(username='popular')
+        cls.quiet = User.objects.create_user(username='quiet')
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=cls.popular)
+        Follow.objects.create(user=cls.quiet, author=cls.popular)
+        Follow.objects.create(user=reader, author=cls.quiet)
+        Post.objects.bulk_create(
+            Post(author=cls.popular, group=cls.group, text=f'Пост {number}')
+            for number in range(25)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_targets(self):
+        """Первые страницы ленты, все группы и популярные профили."""
+        self.assertEqual(list(warmup.targets(pages=2, profiles=1)), [
+            ('index', '/'),
+            ('index', '/?page=2'),
+            ('group_list', '/group/warm-group/'),
+            ('profile', '/profile/popular/'),
+        ])
+
+    def test_command_fills_cache(self):
+        """После прогрева лента рисуется из кэша без запросов постов."""
+        out = io.StringIO()
+        call_command('warm_cache', pages=3, parallel=1, stdout=out)
+        self.assertIn('Прогрето 6 из 6', out.getvalue())
+        with self.assertNumQueries(1):
+            # Остаётся только подсчёт постов для пагинатора
+            self.client.get('/')
+
+    def test_warmed_pages_suit_logged_in_users(self):
+        """Прогретая анонимно лента показывает вошедшему его вкладки,
+        а профиль — кнопку подписки."""
+        call_command('warm_cache', pages=1, parallel=1, stdout=io.StringIO())
+        reader = User.objects.get(username='reader')
+        self.client.force_login(reader)
+        self.assertContains(self.client.get('/'), 'Избранные авторы')
+        self.assertContains(
+            self.client.get('/profile/popular/'), 'Отписаться'
+        )
@@ -0,0 +1,154 @@
+import fcntl
+import json
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
+
+from core import metrics
+
+TOKEN_RE = re.compile(r'^[0-9a-f]{32}$')
+
+BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+class UnknownUpload(UploadError):
+    def __init__(self):
+        super().__init__('Неизвестная загрузка')
+
+
+class OffsetMismatch(UploadError):
+    def __init__(self, offset):
+        super().__init__(f'Ожидалось смещение {offset}')
+        self.offset = offset
+
+
+def _user_dir(user):
+    return os.path.join(settings.CHUNKED_UPLOAD_ROOT, str(user.pk))
+
+
+def _paths(user, token):
+    if not TOKEN_RE.match(token or ''):
+        raise UnknownUpload
+    base = os.path.join(_user_dir(user), token)
+    return base + '.part', base + '.json'
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path) as meta_file:
+            return json.load(meta_file)
+    except FileNotFoundError:
+        raise UnknownUpload
+
+
+def purge_stale(user):
+    directory = _user_dir(user)
+    if not os.path.isdir(directory):
+        return
+    deadline = time.time() - settings.CHUNKED_UPLOAD_EXPIRE
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if os.path.getmtime(path) < deadline:
+            os.remove(path)
+
+
+def start(user, filename, size):
+    if not 0 < size <= settings.CHUNKED_UPLOAD_MAX_SIZE:
+        raise UploadError('Недопустимый размер файла')
+    purge_stale(user)
+    os.makedirs(_user_dir(user), exist_ok=True)
+    token = uuid.uuid4().hex
+    part_path, meta_path = _paths(user, token)
+    open(part_path, 'wb').close()
+    with open(meta_path, 'w') as meta_file:
+        json.dump({
+            'filename': os.path.basename(filename),
+            'size': size,
+            'complete': False,
+        }, meta_file)
+    return token
+
+
+def offset(user, token):
+    part_path, meta_path = _paths(user, token)
+    _read_meta(meta_path)
+    return os.path.getsize(part_path)
+
+
+def append(user, token, start_offset, stream, length):
+    """Дописывает кусок из stream в конец временного файла блоками,
+    не держа его целиком в памяти. Возвращает новое смещение.
+    Смещение проверяется под блокировкой файла, чтобы два одновременных
+    запроса с одним смещением не записали куски вперемешку."""
+    part_path, meta_path = _paths(user, token)
+    _read_meta(meta_path)
+    with open(part_path, 'ab') as part:
+        # Снимается при закрытии файла
+        fcntl.flock(part, fcntl.LOCK_EX)
+        meta = _read_meta(meta_path)
+        current = os.fstat(part.fileno()).st_size
+        if meta['complete'] or start_offset != current:
+            raise OffsetMismatch(current)
+        if current + length > meta['size']:
+            raise UploadError('Кусок выходит за пределы файла')
+        remaining = length
+        while remaining:
+            block = stream.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            part.write(block)
+            remaining -= len(block)
+        part.flush()
+        return os.fstat(part.fileno()).st_size
+
+
+def complete(user, token):
+    part_path, meta_path = _paths(user, token)
+    meta = _read_meta(meta_path)
+    if os.path.getsize(part_path) != meta['size']:
+        raise UploadError('Файл загружен не полностью')
+    try:
+        with Image.open(part_path) as image:
+            image.verify()
+    except Exception:
+        raise UploadError(
+            'Загрузите правильное изображение. Файл, который вы загрузили, '
+            'поврежден или не является изображением.'
+        )
+    meta['complete'] = True
+    with open(meta_path, 'w') as meta_file:
+        json.dump(meta, meta_file)
+    metrics.upload_size.observe(meta['size'], 'chunked')
+    return meta
+
+
+def check_completed(user, token):
+    part_path, meta_path = _paths(user, token)
+    meta = _read_meta(meta_path)
+    if not meta['complete']:
+        raise UploadError('Загрузка не завершена')
+    return part_path, meta
+
+
+@contextmanager
+def open_completed(user, token):
+    """Открытый файл завершённой загрузки; закрывается на выходе."""
+    part_path, meta = check_completed(user, token)
+    with open(part_path, 'rb') as part:
+        yield File(part, name=meta['filename'])
+
+
+def discard(user, token):
+    for path in _paths(user, token):
+        if os.path.exists(path):
+            os.remove(path)
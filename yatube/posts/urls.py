@@ -8,9 +8,17 @@ app_name = 'posts'
 
 urlpatterns = [
     path('create/', views.post_create, name='post_create'),
+    path('uploads/', views.upload_start, name='upload_start'),
+    path('uploads/<str:token>/', views.upload_chunk, name='upload_chunk'),
+    path(
+        'uploads/<str:token>/complete/',
+        views.upload_complete,
+        name='upload_complete'
+    ),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path('search/', views.post_search, name='search'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path(
@@ -1,11 +1,21 @@
-from django.core.paginator import Paginator
+from http import HTTPStatus
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, render, redirect
 from django.urls import reverse
+from django.views.decorators.http import require_http_methods, require_POST
+
+from core.degraded import stale_while_revalidate
+from core.streaming import render_streaming
 
-from .forms import PostForm, CommentForm
+from . import search, uploads
+from .cards import CardPaginator
+from .forms import GalleryForm, PostForm, CommentForm
 from .models import Group, Post, Follow
+from .tasks import schedule_post_images
 
 User = get_user_model()
 
@@ -14,22 +24,30 @@ NUMBER_OF_POSTS = 10
 
 
 def get_pagination_queryset(request, data):
-    paginator = Paginator(data, NUMBER_OF_POSTS)
+    paginator = CardPaginator(data, NUMBER_OF_POSTS)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
 
 
+def render_feed(request, template, context):
+    if settings.STREAMING_FEEDS:
+        return render_streaming(request, template, context)
+    return render(request, template, context)
+
+
+@stale_while_revalidate
 def index(request):
-    post_list = Post.objects.select_related('group', 'author')
+    post_list = Post.objects.all()
     template = 'posts/index.html'
     page_obj = get_pagination_queryset(request, post_list)
     context = {
         'page_obj': page_obj,
     }
-    return render(request, template, context)
+    return render_feed(request, template, context)
 
 
+@stale_while_revalidate
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.all()
@@ -39,9 +57,10 @@ def group_posts(request, slug):
         'group': group,
         'page_obj': page_obj,
     }
-    return render(request, template, context)
+    return render_feed(request, template, context)
 
 
+@stale_while_revalidate
 def profile(request, username):
     author = get_object_or_404(User, username=username)
     post_list = author.posts.all()
@@ -57,13 +76,34 @@ def profile(request, username):
         'author': author,
         'following': following,
     }
+    return render_feed(request, template, context)
+
+
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    post_list = Post.objects.select_related(
+        'group', 'author'
+    ).prefetch_related('images')
+    post_list = search.search_posts(query, post_list)
+    page_obj = get_pagination_queryset(request, post_list)
+    template = 'posts/search.html'
+    context = {
+        'page_obj': page_obj,
+        'query': query,
+    }
     return render(request, template, context)
 
 
+@stale_while_revalidate
 def post_detail(request, post_id):
     form = CommentForm()
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related(
+            'author', 'group'
+        ).prefetch_related('images'),
+        id=post_id
+    )
+    comments = post.comments.select_related('author')
     template = 'posts/post_detail.html'
     context = {
         'post': post,
@@ -76,13 +116,21 @@ def post_detail(request, post_id):
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
-    form = PostForm(request.POST or None, files=request.FILES or None,)
-    if form.is_valid():
-        post = form.save(commit=False)
-        post.author = request.user
-        post.save()
+    form = PostForm(
+        request.POST or None,
+        files=request.FILES or None,
+        user=request.user,
+    )
+    gallery = GalleryForm(request.POST or None, files=request.FILES or None)
+    if form.is_valid() and gallery.is_valid():
+        form.instance.author = request.user
+        post = form.save()
+        gallery.save(post)
+        if form.upload_token:
+            uploads.discard(request.user, form.upload_token)
+        schedule_post_images(post)
         return redirect('posts:profile', username=post.author)
-    context = {'form': form}
+    context = {'form': form, 'gallery': gallery}
     return render(request, template, context)
 
 
@@ -95,13 +143,24 @@ def post_edit(request, post_id):
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=post
+        instance=post,
+        user=request.user,
     )
-    if form.is_valid():
+    gallery = GalleryForm(
+        request.POST or None,
+        files=request.FILES or None,
+        post=post,
+    )
+    if form.is_valid() and gallery.is_valid():
         form.save()
+        gallery.save(post)
+        if form.upload_token:
+            uploads.discard(request.user, form.upload_token)
+        schedule_post_images(post)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'form': form,
+        'gallery': gallery,
         'is_edit': True,
     }
     return render(request, 'posts/create_post.html', context)
@@ -122,13 +181,14 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     post_list = Post.objects.filter(
-        author__in=Follow.objects.filter(user=request.user).values('author'))
+        author__in=Follow.objects.filter(user=request.user).values('author')
+    )
     page_obj = get_pagination_queryset(request, post_list)
     template = 'posts/follow.html'
     context = {
         'page_obj': page_obj,
     }
-    return render(request, template, context)
+    return render_feed(request, template, context)
 
 
 @login_required
@@ -147,3 +207,73 @@ def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
     return redirect(reverse('posts:profile', kwargs={'username': username}))
+
+
+def upload_error(error):
+    if isinstance(error, uploads.UnknownUpload):
+        status = HTTPStatus.NOT_FOUND
+    elif isinstance(error, uploads.OffsetMismatch):
+        return JsonResponse(
+            {'error': str(error), 'offset': error.offset},
+            status=HTTPStatus.CONFLICT
+        )
+    else:
+        status = HTTPStatus.BAD_REQUEST
+    return JsonResponse({'error': str(error)}, status=status)
+
+
+@login_required
+@require_POST
+def upload_start(request):
+    try:
+        size = int(request.POST.get('size', ''))
+        token = uploads.start(
+            request.user, request.POST.get('filename', 'image'), size
+        )
+    except ValueError:
+        return JsonResponse(
+            {'error': 'Не указан размер файла'},
+            status=HTTPStatus.BAD_REQUEST
+        )
+    except uploads.UploadError as error:
+        return upload_error(error)
+    return JsonResponse(
+        {'token': token, 'offset': 0},
+        status=HTTPStatus.CREATED
+    )
+
+
+@login_required
+@require_http_methods(['GET', 'HEAD', 'PATCH'])
+def upload_chunk(request, token):
+    """GET сообщает, сколько байт уже получено (для докачки),
+    PATCH дописывает кусок с позиции из заголовка Upload-Offset."""
+    try:
+        if request.method == 'PATCH':
+            new_offset = uploads.append(
+                request.user,
+                token,
+                int(request.META.get('HTTP_UPLOAD_OFFSET', -1)),
+                request,
+                int(request.META.get('CONTENT_LENGTH') or 0),
+            )
+        else:
+            new_offset = uploads.offset(request.user, token)
+    except ValueError:
+        return JsonResponse(
+            {'error': 'Некорректный заголовок Upload-Offset'},
+            status=HTTPStatus.BAD_REQUEST
+        )
+    except uploads.UploadError as error:
+        return upload_error(error)
+    return JsonResponse({'token': token, 'offset': new_offset})
+
+
+@login_required
+@require_POST
+def upload_complete(request, token):
+    try:
+        meta = uploads.complete(request.user, token)
+    except uploads.UploadError as error:
+        return upload_error(error)
+    return JsonResponse({'token': token, 'size': meta['size']})
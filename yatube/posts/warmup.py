@@ -0,0 +1,73 @@
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count
+from django.urls import reverse
+
+from core.loadtest import HttpTransport, WsgiTransport
+from .models import Group
+
+User = get_user_model()
+
+
+def targets(pages, profiles):
+    """(маршрут, путь) страниц, которые читают первыми после выкладки:
+    первые pages страниц ленты, первые страницы всех групп и профили
+    profiles авторов с наибольшим числом подписчиков."""
+    index = reverse('posts:index')
+    yield 'index', index
+    for page in range(2, pages + 1):
+        yield 'index', f'{index}?page={page}'
+    for slug in Group.objects.values_list('slug', flat=True):
+        yield 'group_list', reverse('posts:group_list', args=(slug,))
+    popular = User.objects.annotate(
+        followers=Count('following')
+    ).filter(followers__gt=0).order_by('-followers', 'pk').values_list(
+        'username', flat=True
+    )[:profiles]
+    for username in popular:
+        yield 'profile', reverse('posts:profile', args=(username,))
+
+
+def fetch(transport, route, path):
+    start = time.perf_counter()
+    status = transport.request('get', path)
+    return route, path, status, (time.perf_counter() - start) * 1000
+
+
+def worker(pending, results, base_url):
+    transport = HttpTransport(base_url) if base_url else WsgiTransport()
+    try:
+        while True:
+            try:
+                route, path = pending.get_nowait()
+            except queue.Empty:
+                return
+            results.append(fetch(transport, route, path))
+    finally:
+        transport.close()
+
+
+def warm(pages, profiles, parallel=1, base_url=None):
+    """Запрашивает страницы анонимно в parallel потоков и возвращает
+    [(маршрут, путь, статус, мс)]. Без base_url страницы рисуются в этом
+    процессе, и в общий для воркеров L2 попадают те же фрагменты, что
+    положил бы сервер. Анонимного прогрева достаточно: в кэшированные
+    фрагменты лент, групп и профилей не попадает ничего, что зависит
+    от входа пользователя."""
+    pending = queue.Queue()
+    for target in targets(pages, profiles):
+        pending.put(target)
+    results = []
+    if parallel <= 1:
+        worker(pending, results, base_url)
+        return results
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        for future in [
+            executor.submit(worker, pending, results, base_url)
+            for _ in range(parallel)
+        ]:
+            future.result()
+    return results
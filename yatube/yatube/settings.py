@@ -10,7 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
+import hashlib
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -45,17 +50,23 @@ INSTALLED_APPS = [
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
     'sorl.thumbnail',
-    'core',
+    'core.apps.CoreConfig',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.compression.GZipMiddleware',
+    'core.metrics.MetricsMiddleware',
+    'core.tracing.TracingMiddleware',
+    'core.querystats.QueryStatsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.profiling.ProfilingMiddleware',
+    'core.tracing.ViewSpanMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -89,6 +100,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Постоянные соединения: без них соединение, открытое прогревом
+        # (YATUBE_WARMUP=1 в wsgi.py), закроется в начале первого запроса
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
     }
 }
 
@@ -153,8 +167,200 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Кэш вариантов картинок для /media/resize/; None — MEDIA_ROOT/resize
+RESIZE_CACHE_ROOT = None
+
+RESIZE_MAX_SIZE = 2000
+
+RESIZE_QUALITY = 85
+
+# 'X-Accel-Redirect' (nginx) или 'X-Sendfile' (apache); None — отдаёт Django
+RESIZE_SENDFILE_HEADER = None
+
+RESIZE_SENDFILE_PREFIX = '/protected/resize/'
+
+# Докачиваемая загрузка картинок кусками (posts:upload_*)
+CHUNKED_UPLOAD_ROOT = os.path.join(BASE_DIR, 'chunked_uploads')
+
+CHUNKED_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+
+CHUNKED_UPLOAD_EXPIRE = 24 * 60 * 60
+
+POST_IMAGES_LIMIT = 10
+
+# 'fts' — FTS5 в SQLite, 'index' — инвертированный индекс PostTerm на любой
+# базе, 'auto' — fts, если доступен. После смены на 'index' выполните
+# manage.py rebuild_search_index.
+SEARCH_BACKEND = 'auto'
+
+# Размеры миниатюр, которые готовятся в фоне после сохранения поста
+POST_IMAGE_GEOMETRIES = ('960x339',)
+
+# L1 в памяти процесса и общий для воркеров L2 в файле SQLite
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': os.environ.get(
+            'CACHE_L2_PATH', os.path.join(BASE_DIR, 'cache', 'l2.sqlite3')
+        ),
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': 1000,
+            'L1_MAX_BYTES': 32 * 1024 * 1024,
+            'L2_MAX_BYTES': 256 * 1024 * 1024,
+            # Изменения других воркеров видны в L1 не позже чем через
+            # столько секунд
+            'POLL_INTERVAL': 1,
+            # HTML страниц сжимается в несколько раз
+            'COMPRESS_MIN_BYTES': 1024,
+            'COMPRESS_LEVEL': 6,
+        },
     }
 }
+
+
+def templates_version(directory):
+    """Короткий хэш путей и содержимого всех файлов каталога."""
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, directory).encode())
+            with open(path, 'rb') as template:
+                digest.update(template.read())
+    return digest.hexdigest()[:12]
+
+
+# L2 общий и переживает выкладку, поэтому ключи версионируются: после
+# выкладки с изменёнными шаблонами старый HTML не отдаётся. DEPLOY_VERSION
+# (например, хэш коммита) задаёт версию явно и сбрасывает кэш при любых
+# изменениях, иначе она считается по шаблонам
+CACHES['default']['KEY_PREFIX'] = (
+    os.environ.get('DEPLOY_VERSION') or templates_version(TEMPLATES_DIR)
+)
+
+# Тесты (manage.py test, pytest) держат L2 во временном каталоге, чтобы
+# не читать записи сервера разработки и не оставлять ему свои
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
+if TESTING:
+    TEST_CACHE_DIR = tempfile.mkdtemp(prefix='yatube-test-cache-')
+    atexit.register(shutil.rmtree, TEST_CACHE_DIR, ignore_errors=True)
+    CACHES['default']['LOCATION'] = os.path.join(
+        TEST_CACHE_DIR, 'l2.sqlite3'
+    )
+
+# Защита от лавины пересчётов ({% fragment_cache %}, get_or_recompute):
+# сколько секунд после срока отдавать прежнее значение, пока его
+# пересчитывают, коэффициент раннего пересчёта и блокировка пересчёта
+CACHE_STALE_TTL = 300
+
+CACHE_EARLY_BETA = 1.0
+
+CACHE_LOCK_TIMEOUT = 30
+
+CACHE_LOCK_WAIT = 2
+
+# Сжатие ответов gzip (core.compression): только текстовые типы, так что
+# картинки и другие уже сжатые файлы не трогаются, и только от
+# GZIP_MIN_BYTES байт — меньшие ответы и так умещаются в один пакет.
+# Уровень 1–9: выше — меньше байт и больше процессора, сравнить уровни
+# на страницах лент можно командой manage.py benchmark_gzip
+GZIP_MIN_BYTES = 1024
+
+GZIP_LEVEL = 6
+
+GZIP_CONTENT_TYPES = (
+    'text/html', 'application/json', 'text/plain', 'text/css',
+    'application/javascript', 'image/svg+xml',
+)
+
+# Потоковая отдача лент (core.streaming): шапка со ссылками на CSS уходит
+# сразу, карточки — по мере отрисовки. Время запросов карточек тогда
+# не попадает в метрики и режим деградации
+STREAMING_FEEDS = False
+
+# Режим деградации лент и поста (core.degraded): если запросы к базе не
+# уложились в DEGRADED_DB_DEADLINE секунд или упали, отдаётся последняя
+# удачная гостевая копия страницы, а сама страница DEGRADED_COOLDOWN
+# секунд не ходит в базу, пока её перерисовывают в фоне. Срок действует,
+# только когда копия уже есть
+DEGRADED_MODE_ENABLED = True
+
+DEGRADED_DB_DEADLINE = 2
+
+DEGRADED_REFRESH_DEADLINE = 10
+
+DEGRADED_COOLDOWN = 10
+
+# Как часто обновлять копию страницы и сколько её хранить
+DEGRADED_SAVE_INTERVAL = 30
+
+DEGRADED_CACHE_TTL = 60 * 60 * 24
+
+# Статистика SQL-запросов по отпечаткам (/admin/queries/, Server-Timing)
+QUERY_STATS_ENABLED = True
+
+QUERY_STATS_TOP = 50
+
+QUERY_STATS_MAX_FINGERPRINTS = 1000
+
+# Метрики Prometheus (/metrics). При нескольких процессах укажите общий
+# каталог: каждый процесс раз в METRICS_FLUSH_INTERVAL секунд пишет туда
+# свои значения, а /metrics их складывает. Очищайте каталог при деплое.
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+
+METRICS_FLUSH_INTERVAL = 5
+
+# Токен сборщика: Authorization: Bearer <токен> (bearer_token в
+# Prometheus). Без него /metrics видят только сотрудники
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Профилирование запросов (/admin/profiles/): сотрудник шлёт заголовок
+# X-Profile: 1 (семплирование) или X-Profile: cprofile; кроме того,
+# профилируется доля PROFILER_SAMPLE_RATE запросов, а сохраняются из них
+# те, что медленнее PROFILER_THRESHOLD_MS, по маршрутам PROFILER_ROUTES
+# (пусто — все маршруты)
+PROFILER_DIR = os.path.join(BASE_DIR, 'profiles')
+
+PROFILER_SAMPLE_RATE = 0
+
+PROFILER_THRESHOLD_MS = 500
+
+PROFILER_ROUTES = ('posts:profile', 'posts:follow_index')
+
+PROFILER_INTERVAL = 0.005
+
+PROFILER_KEEP = 100
+
+PROFILER_TOP_STACKS = 50
+
+# Трассировка запросов: span'ы view, SQL, шаблонов и миниатюр в формате
+# Zipkin v2. Трассы пишутся строками JSON в TRACING_FILE и/или отправляются
+# в коллектор (например, http://localhost:9411/api/v2/spans)
+TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE', 0))
+
+TRACING_FILE = os.path.join(BASE_DIR, 'traces', 'traces.jsonl')
+
+TRACING_COLLECTOR_URL = os.environ.get('TRACING_COLLECTOR_URL')
+
+TRACING_SERVICE_NAME = 'yatube'
+
+# Диагностика памяти (/admin/memory/, manage.py memory_report <pid>).
+# Если задан MEMORY_SIGNAL (например, 'SIGUSR2'), по этому сигналу процесс
+# включает tracemalloc, а по следующим сигналам делает снимок и пишет
+# отчёт в MEMORY_REPORT_DIR/<pid>.json. gunicorn сам использует
+# SIGUSR1/SIGUSR2 — для него выберите сигнал, который он не занимает.
+MEMORY_SIGNAL = None
+
+MEMORY_REPORT_DIR = os.path.join(BASE_DIR, 'memory_reports')
+
+MEMORY_TRACE_FRAMES = 1
+
+MEMORY_TOP = 25
+
+# Куда manage.py check_budgets и тесты бюджетов производительности пишут
+# JSON-отчёт
+PERF_BUDGET_REPORT = os.environ.get(
+    'PERF_BUDGET_REPORT', os.path.join(BASE_DIR, 'perf_budget_report.json')
+)
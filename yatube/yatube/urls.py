@@ -19,11 +19,29 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
+from core.views import (
+    memory_view, metrics_view, profile_detail, profiles, query_stats, resize
+)
+
 urlpatterns = [
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
+    path('metrics', metrics_view, name='metrics'),
+    path('admin/queries/', query_stats, name='query_stats'),
+    path('admin/memory/', memory_view, name='memory'),
+    path('admin/profiles/', profiles, name='profiles'),
+    path(
+        'admin/profiles/<str:profile_id>/',
+        profile_detail,
+        name='profile_detail'
+    ),
     path('admin/', admin.site.urls),
     path('about/', include('about.urls', namespace='about')),
+    path(
+        'media/resize/<str:signature>/<str:geometry>/<path:path>',
+        resize,
+        name='resize'
+    ),
     path('', include('posts.urls', namespace='index')),
 ]
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+if os.environ.get('YATUBE_WARMUP') == '1':
+    # Прогрев до первого запроса: импорты, резолвер URL, шаблоны, БД
+    from core.warmup import warm_up
+    warm_up()